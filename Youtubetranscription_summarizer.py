@@ -1,9 +1,26 @@
-import os, tempfile, subprocess, json, re, time, shutil
+import os, tempfile, subprocess, wave, json, re, time, shutil, threading, hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Callable, Any
 import yt_dlp
 from faster_whisper import WhisperModel
 import socket
+from scheduler import SCHED_TRANSCRIBE_SLOTS
+
+# Whisper model defaults (override via env)
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "auto")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "default")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 = let CTranslate2 decide
+WHISPER_MAX_MODELS = int(os.getenv("WHISPER_MAX_MODELS", "2"))  # models kept resident
+# Concurrent transcribe() calls one shared model serves; match the scheduler's whisper slots
+WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", str(SCHED_TRANSCRIBE_SLOTS)))
+
+# Map-reduce summarization settings (override via env)
+PHI_CHUNK_TOKENS = int(os.getenv("PHI_CHUNK_TOKENS", "3000"))  # transcript tokens per map call
+PHI_MAX_CONCURRENCY = int(os.getenv("PHI_MAX_CONCURRENCY", "4"))  # LLM calls in flight
+PHI_REDUCE_FAN_IN = int(os.getenv("PHI_REDUCE_FAN_IN", "4"))  # partials merged per reduce call
+PHI_REDUCE_MAX_ROUNDS = int(os.getenv("PHI_REDUCE_MAX_ROUNDS", "6"))  # the last round merges whatever is left
 
 
 def main(url:str):
@@ -49,7 +66,8 @@ def extract_domain(url):
 def get_video_id(url:str)->str:
     # Extract video ID from various YouTube URL formats
     m = re.search(r"(?:v=|/shorts/|/live/|/embed/)([A-Za-z0-9_-]{6,})", url)
-    return m.group(1) if m else str(abs(hash(url)))
+    # Fall back to a stable digest (hash() is salted per process, useless as a cache key)
+    return m.group(1) if m else hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
 
 def ensure_ffmpeg():
     """
@@ -88,6 +106,18 @@ def _require(bin_name: str):
     if shutil.which(bin_name) is None:
         raise YTDLPError(f"Required executable '{bin_name}' not found in PATH.")
 
+def _single_pass_args(target_sr: int, target_channels: int) -> list:
+    # Output args for yt-dlp's FFmpegExtractAudio. Pinning s16 before the downmix/resample
+    # reproduces the old two-pass chain (s16 WAV -> ffmpeg -ac/-ar) byte for byte.
+    return ["-af", "aformat=sample_fmts=s16", "-ac", str(target_channels), "-ar", str(target_sr)]
+
+def _wav_matches(path: Path, target_sr: int, target_channels: int) -> bool:
+    try:
+        with wave.open(str(path), "rb") as w:
+            return w.getframerate() == target_sr and w.getnchannels() == target_channels
+    except Exception:
+        return False
+
 def download_youtube_audio_wav16k_api(
     youtube_url: str,
     out_dir: Optional[str] = None,
@@ -96,6 +126,7 @@ def download_youtube_audio_wav16k_api(
     quiet: bool = True,
     keep_intermediate: bool = False,
     progress_hook: Optional[Callable[[dict[str, Any]], None]] = None,
+    single_pass: bool = True,
 ) -> str:
     """
     Download YouTube audio via yt_dlp's Python API, extract to WAV,
@@ -110,6 +141,8 @@ def download_youtube_audio_wav16k_api(
     quiet : bool               Suppress yt-dlp logs if True.
     keep_intermediate : bool   Keep the pre-downsampled WAV if True.
     progress_hook : callable   Optional yt-dlp progress hook.
+    single_pass : bool         Resample inside yt-dlp's extract step (no full-rate
+                               intermediate WAV). Output is byte-identical.
 
     Raises
     ------
@@ -139,6 +172,8 @@ def download_youtube_audio_wav16k_api(
                 "preferredquality": "0",
             }
         ],
+        # Single pass: FFmpegExtractAudio writes 16 kHz mono directly
+        "postprocessor_args": {"extractaudio+ffmpeg_o": _single_pass_args(target_sr, target_channels)} if single_pass else {},
         "quiet": quiet,
         "no_warnings": quiet,
         "progress_hooks": hooks,
@@ -158,25 +193,31 @@ def download_youtube_audio_wav16k_api(
         return "yt-dlp completed but no WAV was found."
     pre_wav = max(pre_wavs, key=lambda p: p.stat().st_mtime)
 
-    # Second stage: force 16 kHz mono via ffmpeg
     final_wav = pre_wav.with_name(pre_wav.stem + f".{target_sr}Hz.{target_channels}ch.wav")
-    try:
-        subprocess.run(
-            [
-                "ffmpeg", "-y",
-                "-i", str(pre_wav),
-                "-ac", str(target_channels),
-                "-ar", str(target_sr),
-                str(final_wav),
-            ],
-            check=True,
-            stdout=subprocess.PIPE if quiet else None,
-            stderr=subprocess.PIPE if quiet else None,
-            text=True,
-        )
-    except subprocess.CalledProcessError as e:
-        #raise YTDLPError(f"ffmpeg failed to resample: {e.stderr or e.stdout}") from e
-        return f"ffmpeg failed to resample: {e.stderr or e.stdout}"
+    if single_pass and _wav_matches(pre_wav, target_sr, target_channels):
+        # yt-dlp already wrote 16 kHz mono; just give it the usual final name
+        pre_wav.replace(final_wav)
+        pre_wav = final_wav
+    else:
+        # Second stage: force 16 kHz mono via ffmpeg (two-pass mode, or the source
+        # was already WAV so yt-dlp skipped conversion)
+        try:
+            subprocess.run(
+                [
+                    "ffmpeg", "-y",
+                    "-i", str(pre_wav),
+                    "-ac", str(target_channels),
+                    "-ar", str(target_sr),
+                    str(final_wav),
+                ],
+                check=True,
+                stdout=subprocess.PIPE if quiet else None,
+                stderr=subprocess.PIPE if quiet else None,
+                text=True,
+            )
+        except subprocess.CalledProcessError as e:
+            #raise YTDLPError(f"ffmpeg failed to resample: {e.stderr or e.stdout}") from e
+            return f"ffmpeg failed to resample: {e.stderr or e.stdout}"
 
     # Clean up intermediates if desired
     if not keep_intermediate:
@@ -189,36 +230,203 @@ def download_youtube_audio_wav16k_api(
     return str(final_wav)
 
 
-def transcribe_faster_whisper(wav_path:str, model_name="base.en"):
+class WhisperModelRegistry:
+    """
+    Process-wide LRU cache of loaded WhisperModel instances.
+
+    Models are keyed by (model_name, device, compute_type, cpu_threads, num_workers) and loaded
+    at most once; concurrent callers asking for the same model wait on a single load.
+    Keeps at most `max_models` resident and evicts the least recently used one.
+    """
+
+    def __init__(self, max_models: int = 2):
+        self.max_models = max(1, max_models)
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = {}
+
+    def get(self, model_name: str = "base.en", device: str = WHISPER_DEVICE,
+            compute_type: str = WHISPER_COMPUTE_TYPE, cpu_threads: int = WHISPER_CPU_THREADS,
+            num_workers: int = WHISPER_NUM_WORKERS) -> WhisperModel:
+        key = (model_name, device, compute_type, cpu_threads, num_workers)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other models stay available meanwhile
+        with load_lock:
+            with self._lock:
+                model = self._models.get(key)
+                if model is not None:
+                    # Another thread finished loading while we waited
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return model
+                self.misses += 1
+
+            t0 = time.perf_counter()
+            # num_workers > 1 lets concurrent transcribe() calls run in parallel on one set of weights
+            model = WhisperModel(model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads,
+                                 num_workers=max(1, num_workers))
+            elapsed = time.perf_counter() - t0
+            print(f"[whisper] loaded {key} in {elapsed:.2f}s")
+
+            with self._lock:
+                self._models[key] = model
+                self.load_seconds[key] = elapsed
+                while len(self._models) > self.max_models:
+                    old_key, _ = self._models.popitem(last=False)
+                    self.evictions += 1
+                    print(f"[whisper] evicted {old_key}")
+            return model
+
+    def warm(self, model_names, **kwargs):
+        for name in model_names:
+            try:
+                self.get(name, **kwargs)
+            except Exception as e:
+                print(f"[whisper] warm-up failed for {name}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "resident": [list(k) for k in self._models],
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_seconds": {"/".join(map(str, k)): round(v, 3) for k, v in self.load_seconds.items()},
+                # Each hit would otherwise have paid the model's load time again
+                "saved_seconds": round(self.hits * (sum(self.load_seconds.values()) / len(self.load_seconds)), 3)
+                if self.load_seconds else 0.0,
+            }
+
+
+_model_registry = WhisperModelRegistry(WHISPER_MAX_MODELS)
+
+def get_whisper_model(model_name: str = "base.en", **kwargs) -> WhisperModel:
+    return _model_registry.get(model_name, **kwargs)
+
+def warm_whisper_models(model_names, **kwargs):
+    _model_registry.warm(model_names, **kwargs)
+
+def whisper_model_stats() -> dict:
+    return _model_registry.stats()
+
+def stream_faster_whisper(wav_path:str, model_name="base.en", device: str = WHISPER_DEVICE,
+                          compute_type: str = WHISPER_COMPUTE_TYPE, cpu_threads: int = WHISPER_CPU_THREADS,
+                          vad_filter: bool = True, vad_parameters: Optional[dict] = None,
+                          num_workers: int = WHISPER_NUM_WORKERS):
+    """
+    Yield transcript segments as dicts ({"start", "end", "text"}) as soon as
+    faster-whisper decodes them. Errors are raised to the caller.
+    """
+    model = get_whisper_model(model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads,
+                              num_workers=num_workers)
+    segments, info = model.transcribe(wav_path, beam_size=1, vad_filter=vad_filter, vad_parameters=vad_parameters)
+    for s in segments:
+        yield {"start": s.start, "end": s.end, "text": s.text}
+
+def format_segments(segments) -> str:
+    # "[mm:ss] text" lines, same layout used for the LLM chunks below
+    return "\n".join(f"[{int(s['start']//60):02d}:{int(s['start']%60):02d}] {s['text'].strip()}" for s in segments)
+
+def transcribe_faster_whisper(wav_path:str, model_name="base.en", device: str = WHISPER_DEVICE,
+                              compute_type: str = WHISPER_COMPUTE_TYPE, cpu_threads: int = WHISPER_CPU_THREADS,
+                              vad_filter: bool = True, vad_parameters: Optional[dict] = None):
     try:
-        model = WhisperModel(model_name)
-        segments, info = model.transcribe(wav_path, beam_size=1, vad_filter=True)
-        out = []
-        for s in segments:
-            out.append({"start": s.start, "end": s.end, "text": s.text})
+        out = list(stream_faster_whisper(wav_path, model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads,
+                                         vad_filter=vad_filter, vad_parameters=vad_parameters))
         #return {"language": info.language, "segments": out}
         return {"segments": out}
     except Exception as e:
         return f"Faster-Whisper transcription failed: {e}"
 
-def summarize_with_phi(transcript_segments, sysprompt, userprompt, phi_client):
-    # map-reduce pseudo:
-    CHUNK_SEC = 600  # ~10min per chunk as a starting point
-    chunks, cur, cur_t = [], [], 0.0
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; no tokenizer dependency
+    return len(text) // 4 + 1
+
+def chunk_segments_by_tokens(transcript_segments, max_tokens: int = PHI_CHUNK_TOKENS) -> list:
+    """Group consecutive segments so each chunk's formatted text stays within max_tokens."""
+    chunks, cur, cur_tokens = [], [], 0
     for seg in transcript_segments:
-        cur.append(seg); cur_t += (seg["end"]-seg["start"])
-        if cur_t >= CHUNK_SEC:
-            chunks.append(cur); cur, cur_t = [], 0.0
+        seg_tokens = estimate_tokens(format_segments([seg]))
+        if cur and cur_tokens + seg_tokens > max_tokens:
+            chunks.append(cur); cur, cur_tokens = [], 0
+        cur.append(seg); cur_tokens += seg_tokens
     if cur: chunks.append(cur)
+    return chunks
+
+def reduce_summaries(partials, sysprompt, phi_client, max_tokens: int = PHI_CHUNK_TOKENS,
+                     max_concurrency: int = PHI_MAX_CONCURRENCY, fan_in: int = PHI_REDUCE_FAN_IN,
+                     max_rounds: int = PHI_REDUCE_MAX_ROUNDS, final_instructions: Optional[str] = None) -> str:
+    """
+    Tree-reduce partial summaries: each round merges groups of up to fan_in partials
+    (fewer if they would exceed max_tokens, but never fewer than 2) concurrently,
+    until one summary is left. N partials take about log_fan_in(N) rounds instead of
+    one oversized merge call; round max_rounds merges everything that remains.
+    final_instructions (the user's prompt) shapes the last merge, which produces the answer.
+    """
+    partials = list(partials)
+    if len(partials) <= 1:
+        return partials[0] if partials else ""
+    fan_in = max(2, fan_in)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        for round_no in range(1, max(1, max_rounds) + 1):
+            if round_no == max_rounds:
+                groups = [partials]
+            else:
+                groups, cur, cur_tokens = [], [], 0
+                for part in partials:
+                    part_tokens = estimate_tokens(part)
+                    # Pairs are merged even over budget, so every round shrinks the list
+                    if len(cur) >= fan_in or (len(cur) >= 2 and cur_tokens + part_tokens > max_tokens):
+                        groups.append(cur); cur, cur_tokens = [], 0
+                    cur.append(part); cur_tokens += part_tokens
+                if cur: groups.append(cur)
+
+            final = len(groups) == 1
+            def merge(group):
+                if len(group) == 1:
+                    return group[0]  # a leftover single partial carries over to the next round as is
+                if final and final_instructions:
+                    prompt = (f"{final_instructions}\n\nAnswer from the {len(group)} chunk summaries below, "
+                              f"merged into one response + top 5 timestamps.")
+                elif final:
+                    prompt = f"Merge the {len(group)} chunk summaries into one concise summary + top 5 timestamps."
+                else:
+                    prompt = f"Merge the {len(group)} consecutive chunk summaries into one summary, keeping key timestamps."
+                return phi_client.summarize(sysprompt, prompt + "\n\n" + "\n\n".join(group))
+            partials = list(pool.map(merge, groups))
+            if final:
+                return partials[0]
+
+def summarize_with_phi(transcript_segments, sysprompt, userprompt, phi_client, max_tokens: int = PHI_CHUNK_TOKENS,
+                       max_concurrency: int = PHI_MAX_CONCURRENCY, fan_in: int = PHI_REDUCE_FAN_IN):
+    """
+    Map-reduce summary of a long transcript. Chunks are sized by token budget, the
+    map calls run concurrently (at most max_concurrency in flight) and the partial
+    summaries are tree-reduced. phi_client only needs summarize(sysprompt, prompt).
+    """
+    chunks = chunk_segments_by_tokens(transcript_segments, max_tokens)
 
-    partials = []
-    for idx, chunk in enumerate(chunks, 1):
-        text = "\n".join(f"[{int(s['start']//60):02d}:{int(s['start']%60):02d}] {s['text']}" for s in chunk)
-        prompt = f"{userprompt}\n\nTRANSCRIPT CHUNK {idx}:\n{text}\n\nReturn: bullet summary + key timestamps."
-        partials.append(phi_client.summarize(sysprompt, prompt))  # your existing call
+    def summarize_chunk(args):
+        idx, chunk = args
+        prompt = f"{userprompt}\n\nTRANSCRIPT CHUNK {idx}:\n{format_segments(chunk)}\n\nReturn: bullet summary + key timestamps."
+        return phi_client.summarize(sysprompt, prompt)
 
-    merged_prompt = f"Merge the {len(partials)} chunk summaries into one concise summary + top 5 timestamps."
-    return phi_client.summarize(sysprompt, merged_prompt + "\n\n" + "\n\n".join(partials))
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        partials = list(pool.map(summarize_chunk, enumerate(chunks, 1)))
+    print(f"[phi] map phase: {len(chunks)} chunks, concurrency={max_concurrency}")
+    return reduce_summaries(partials, sysprompt, phi_client, max_tokens, max_concurrency, fan_in,
+                            final_instructions=userprompt)
 
 if __name__ == "__main__":
     main(url=None)  # for local testing
\ No newline at end of file
@@ -1,97 +1,170 @@
 import os
+import asyncio
 import base64
-import tempfile
 import requests
-from datetime import datetime
+import httpx
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import gradio as gr
 from dotenv import load_dotenv
-from openai import AzureOpenAI  # official OpenAI SDK, works with Azure endpoints
+import llm_client  # shared AzureOpenAI client (official OpenAI SDK)
 import json
+import functools
+import contextlib
 import subprocess
+import threading
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import Youtubetranscription_summarizer
+import summary_cache
+import transcript_cache
+import parallel_transcribe
+import audio_utils
+import downloader
+import scheduler  # stage-aware CPU / I/O pools with short-job priority
 from extract.app.Youtubeextraction import extract  # Youtube download helper functions 
+from extract.utils.telemetry import span, render_metrics, start_metrics_server  # per-stage histograms on /metrics
 #from pydantic import BaseModel, AnyUrl # Pydantic models for request validation in yiutube extraction
 #from fastapi import FastAPI, HTTPException # FastAPI for building the API
 #app = FastAPI() ## Initialize FastAPI app for testing in local
 #from extractor.app.storage import upload_and_sign  # Youtube storage helper functions
 import re
+import time
+
+# Push transcript segments to the UI while faster-whisper runs (YouTube path)
+STREAM_TRANSCRIPT = os.getenv("STREAM_TRANSCRIPT", "1") == "1"
+STREAM_UPDATE_SEC = float(os.getenv("STREAM_UPDATE_SEC", "1.0"))
+
+# Whisper settings for the YouTube path; part of the transcript cache key
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base.en")
+WHISPER_VAD_FILTER = os.getenv("WHISPER_VAD_FILTER", "1") == "1"
+
+# Transcripts above this size are summarized with concurrent map-reduce
+PHI_MAPREDUCE_MIN_TOKENS = int(os.getenv("PHI_MAPREDUCE_MIN_TOKENS", "6000"))
+
+# Async request path (process_audio_async) settings
+ASYNC_PIPELINE = os.getenv("ASYNC_PIPELINE", "1") == "1"
+ASYNC_CONCURRENCY_LIMIT = int(os.getenv("ASYNC_CONCURRENCY_LIMIT", "200"))  # in-flight Gradio requests
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "100"))
+# Sync process_audio requests in flight; whisper and encoding are bounded by the scheduler, not by this
+SYNC_CONCURRENCY_LIMIT = int(os.getenv("SYNC_CONCURRENCY_LIMIT", "32"))
+
+load_dotenv()  # once per process; llm_client rebuilds its client if these values change
 
 # --- LLM call (Azure OpenAI with API key) -----------------------------------
 
-def summarize_input(audio_b64: str = None, text_input: str = None, sys_prompt: str = None, user_prompt: str = None, Starttime: datetime = None) -> str:
+def _build_messages(audio_b64: str = None, text_input: str = None, sys_prompt: str = None, user_prompt: str = None,
+                    audio_format: str = "mp3"):
     """
-    Calls Azure OpenAI Chat Completions with audio input (base64 mp3) or text input, or both.
+    Build the chat messages for summarize_input / summarize_input_async.
+    Returns (messages, json_text); raises ValueError with a user-facing message
+    when text_input has an unsupported shape.
     """
-    load_dotenv()
+    # Reset json_text for logging
+    json_text = ""
+    system_message = sys_prompt.strip() if sys_prompt else (
+        "You are an AI assistant with a charter to clearly analyze the customer enquiry."
+    )
+    user_text = user_prompt.strip() if user_prompt else (
+        "Summarize the provided content." if audio_b64 or text_input else "No input provided."
+    )
 
-    endpoint = os.getenv("AC_OPENAI_ENDPOINT")
-    api_key = os.getenv("AC_OPENAI_API_KEY")
-    deployment = os.getenv("AC_MODEL_DEPLOYMENT")
-    api_version = os.getenv("AC_OPENAI_API_VERSION")
+    content = [{"type": "text", "text": user_text}]
+    
+    if audio_b64:
+        content.append({
+            "type": "input_audio",
+            "input_audio": {"data": audio_b64, "format": audio_format},
+        })
+    if text_input is not None:
+        # Debugging: Print the type and value of text_input
+        #print(f"Debug: text_input type={type(text_input)}, value={text_input}")
+        if isinstance(text_input, str):
+            try:
+                # Try to parse the string as JSON to see if it's a list or dict
+                parsed = json.loads(text_input)
+                if isinstance(parsed, (list, dict)):
+                    # If it's a list or dict, convert back to JSON string
+                    content.append({"type": "text", "text": json.dumps(parsed)})
+                else:
+                    # If it's a string but not a JSON list/dict, use it as-is
+                    content.append({"type": "text", "text": text_input})
+            except json.JSONDecodeError:
+                # If it's not valid JSON, treat it as a regular string
+                content.append({"type": "text", "text": text_input})
+        elif isinstance(text_input, (list, dict)):
+            try:
+                # Convert list or dict to JSON-formatted string
+                json_text = json.dumps(text_input)
+                content.append({"type": "text", "text": json_text})
+            except (TypeError, ValueError):
+                raise ValueError("Error: text_input (list or dict) could not be converted to JSON.")
+        else:
+            raise ValueError(f"Error: text_input must be a string, list, or dict, got {type(text_input)}.")
 
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": content},
+    ]
+    return messages, json_text
 
-    if not endpoint or not api_key or not deployment:
+def _llm_config_error():
+    if not os.getenv("AC_OPENAI_ENDPOINT") or not os.getenv("AC_OPENAI_API_KEY") or not os.getenv("AC_MODEL_DEPLOYMENT"):
         return "Server misconfiguration: required env vars missing."
-    # Reset json_text for logging
-    json_text = ""
+    return None
+
+def _log_llm_call(Starttime, user_prompt, audio_b64, json_text):
+    Enddate = datetime.now()
+    Callduration = Enddate - Starttime[0]
+    print(f"AudioChatSummarizer API call with a duration of {Callduration}: prompt_length={len(user_prompt or '')}, "
+          f"audio_size={len(audio_b64 or '')}, text_input_size={len(json_text or '')}")
+
+def summarize_input(audio_b64: str = None, text_input: str = None, sys_prompt: str = None, user_prompt: str = None, Starttime: datetime = None,
+                   audio_format: str = "mp3", audio_sec: float = None) -> str:
+    """
+    Calls Azure OpenAI Chat Completions with audio input (base64 mp3 or wav) or text input, or both.
+    """
+    config_error = _llm_config_error()
+    if config_error:
+        return config_error
     try:
-        client = AzureOpenAI(
-            api_key=api_key,
-            api_version=api_version,
-            azure_endpoint=endpoint,
-        )
+        messages, json_text = _build_messages(audio_b64, text_input, sys_prompt, user_prompt, audio_format)
+    except ValueError as ex:
+        return str(ex)
+    try:
+        # Shared client: keeps the HTTP connection pool (and TLS sessions) across requests
+        client = llm_client.get_client()
+        with span("llm", nbytes=len(audio_b64 or "") + len(json_text or ""), audio_sec=audio_sec):
+            response = client.chat.completions.create(
+                model=os.getenv("AC_MODEL_DEPLOYMENT"),
+                messages=messages,
+            )
+        _log_llm_call(Starttime, user_prompt, audio_b64, json_text)
+        return response.choices[0].message.content
 
-        system_message = sys_prompt.strip() if sys_prompt else (
-            "You are an AI assistant with a charter to clearly analyze the customer enquiry."
-        )
-        user_text = user_prompt.strip() if user_prompt else (
-            "Summarize the provided content." if audio_b64 or text_input else "No input provided."
-        )
+    except Exception as ex:
+        return print(f"Error from Azure OpenAI: {ex}")
 
-        content = [{"type": "text", "text": user_text}]
-        
-        if audio_b64:
-            content.append({
-                "type": "input_audio",
-                "input_audio": {"data": audio_b64, "format": "mp3"},
-            })
-        if text_input is not None:
-            # Debugging: Print the type and value of text_input
-            #print(f"Debug: text_input type={type(text_input)}, value={text_input}")
-            if isinstance(text_input, str):
-                try:
-                    # Try to parse the string as JSON to see if it's a list or dict
-                    parsed = json.loads(text_input)
-                    if isinstance(parsed, (list, dict)):
-                        # If it's a list or dict, convert back to JSON string
-                        content.append({"type": "text", "text": json.dumps(parsed)})
-                    else:
-                        # If it's a string but not a JSON list/dict, use it as-is
-                        content.append({"type": "text", "text": text_input})
-                except json.JSONDecodeError:
-                    # If it's not valid JSON, treat it as a regular string
-                    content.append({"type": "text", "text": text_input})
-            elif isinstance(text_input, (list, dict)):
-                try:
-                    # Convert list or dict to JSON-formatted string
-                    json_text = json.dumps(text_input)
-                    content.append({"type": "text", "text": json_text})
-                except (TypeError, ValueError):
-                    return "Error: text_input (list or dict) could not be converted to JSON."
-            else:
-                return f"Error: text_input must be a string, list, or dict, got {type(text_input)}."
-            
-        response = client.chat.completions.create(
-            model=deployment,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": content},
-            ],
-        )
-        Enddate = datetime.now()
-        Callduration = Enddate - Starttime[0]
-        print(f"AudioChatSummarizer API call with a duration of {Callduration}: prompt_length={len(user_prompt or '')}, "
-              f"audio_size={len(audio_b64 or '')}, text_input_size={len(json_text or '')}")
+async def summarize_input_async(audio_b64: str = None, text_input: str = None, sys_prompt: str = None, user_prompt: str = None, Starttime: datetime = None,
+                               audio_format: str = "mp3", audio_sec: float = None) -> str:
+    """
+    Async twin of summarize_input using the shared AsyncAzureOpenAI client.
+    """
+    config_error = _llm_config_error()
+    if config_error:
+        return config_error
+    try:
+        messages, json_text = _build_messages(audio_b64, text_input, sys_prompt, user_prompt, audio_format)
+    except ValueError as ex:
+        return str(ex)
+    try:
+        client = llm_client.get_async_client()
+        with span("llm", nbytes=len(audio_b64 or "") + len(json_text or ""), audio_sec=audio_sec):
+            response = await client.chat.completions.create(
+                model=os.getenv("AC_MODEL_DEPLOYMENT"),
+                messages=messages,
+            )
+        _log_llm_call(Starttime, user_prompt, audio_b64, json_text)
         return response.choices[0].message.content
 
     except Exception as ex:
@@ -127,13 +200,36 @@ def encode_audio_from_path(path: str) -> str:
 
 
 def download_to_temp_mp3(url: str) -> str:
-    r = requests.get(url, stream=True, timeout=30)
-    r.raise_for_status()
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-        for chunk in r.iter_content(chunk_size=8192):
-            if chunk:
-                tmp.write(chunk)
-        return tmp.name
+    # Parallel ranged + resumable when the server allows it, single stream otherwise
+    with span("download") as s:
+        path = downloader.download(url, suffix=".mp3")
+        s.set(nbytes=os.path.getsize(path))
+    return path
+
+def encode_for_upload(path: str, audio_sec: float = None, **kwargs):
+    """audio_utils.encode_audio_for_upload under an "encode" span; returns (audio_b64, audio_format)."""
+    with span("encode", audio_sec=audio_sec) as s:
+        audio_b64, audio_format = audio_utils.encode_audio_for_upload(path, **kwargs)
+        s.set(nbytes=len(audio_b64), format=audio_format)
+    return audio_b64, audio_format
+
+_async_http = None
+
+def _get_async_http() -> httpx.AsyncClient:
+    # One pooled client for downloads and extractor calls on the Gradio event loop
+    global _async_http
+    if _async_http is None:
+        _async_http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=ASYNC_HTTP_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(30.0),
+            follow_redirects=True,
+        )
+    return _async_http
+
+async def download_to_temp_mp3_async(url: str) -> str:
+    # The ranged downloader fans out over its own threads; keep it off the event loop
+    return await asyncio.get_running_loop().run_in_executor(
+        scheduler.get_scheduler().executor("download"), download_to_temp_mp3, url)
 
 # function to read files
 def file_read(filepath):
@@ -152,54 +248,211 @@ def file_read(filepath):
 ###Download youtube video and extract audio using yt-dlp and ffmpeg
 #### Fixing code to resolve 404 error
 
+def _extract_endpoint() -> str:
+    EXTRACT_API = os.getenv("AZURE_CONTAINER_APP_FQDN") ## Fast API endpoint for youtube extraction "https://<your-app-fqdn>/extract"
+    print(f"Extract_API value: {EXTRACT_API}")
+    base = EXTRACT_API.rstrip("/")
+    return base if base.endswith("/extract") else f"{base}/extract"
+
+def _audio_url_from_response(r) -> str:
+    # Works for both requests and httpx responses
+    if r.status_code >= 400:
+        # log details instead of raising blindly
+        print("STATUS:", r.status_code)
+        print("HEADERS:", r.headers)
+        print("BODY:", r.text[:2000])
+        r.raise_for_status()
+
+    # Response parsing: support dict or plain string
+    ctype = r.headers.get("Content-Type", "")
+    if "application/json" in ctype:
+        data = r.json()
+        # If server validates response_model to dict
+        if isinstance(data, dict) and "audio_url" in data:
+            return data["audio_url"]
+        # If server returns plain string in JSON (rare)
+        if isinstance(data, str):
+            return data
+        raise ValueError(f"Unexpected JSON shape: {data}")
+    else:
+        # Plain text URL response_model=str
+        text = r.text.strip()
+        if text.startswith("http"):
+            return text
+        raise ValueError(f"Unexpected text response: {text[:200]}")
+
+# Codec the extractor should deliver: flac is lossless at about half the bytes of wav,
+# opus is lossy and smallest. Extractors that predate ?format= always send wav.
+EXTRACT_FORMAT = os.getenv("EXTRACT_FORMAT", "flac")
+EXTRACT_PAYLOAD = {"format": EXTRACT_FORMAT, "sample_rate": 16000, "mono": True}
+EXTRACT_TIMEOUT = 90  # per HTTP call
+EXTRACT_JOB_TIMEOUT = float(os.getenv("EXTRACT_JOB_TIMEOUT", "3600"))  # overall wait for one extraction job
+EXTRACT_POLL_MAX_SEC = float(os.getenv("EXTRACT_POLL_MAX_SEC", "10"))
+
+def _jobs_endpoint() -> str:
+    return _extract_endpoint()[:-len("/extract")] + "/jobs"
+
+def _poll_delays():
+    # 1s, 1.5s, 2.25s ... capped at EXTRACT_POLL_MAX_SEC
+    delay = 1.0
+    while True:
+        yield delay
+        delay = min(delay * 1.5, EXTRACT_POLL_MAX_SEC)
+
+def _retry_after_sec(headers, default: float) -> float:
+    # Retry-After is either delta-seconds or an HTTP date
+    value = headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+def _busy_wait(r, delays, deadline: float) -> float:
+    # Seconds to wait before resubmitting after a 429; raises once that would pass the deadline
+    wait = _retry_after_sec(r.headers, next(delays))
+    if time.monotonic() + wait > deadline:
+        raise TimeoutError(f"extractor still busy (429) after {EXTRACT_JOB_TIMEOUT:.0f}s")
+    print(f"[extract] extractor busy (429), resubmitting in {wait:.1f}s")
+    return wait
+
+def _extract_outcome(audio_url: str) -> str:
+    # The fetchers return an error message instead of raising
+    return "ok" if isinstance(audio_url, str) and audio_url.startswith("http") else "error"
+
+def _job_audio_url(job: dict):
+    # Signed URL when done, None while pending, raises when the job ended without one
+    if job["status"] == "done":
+        return job["audio_url"]
+    if job["status"] in ("queued", "running"):
+        return None
+    raise RuntimeError(f"extraction job {job['id']} {job['status']}: {job.get('error')}")
+
 def fetch_audio_from_youtube(youtube_url: str) -> str:
     """
-    Calls the extractor service and returns the signed audio URL.
+    Submits an extraction job (POST /jobs) and polls it with backoff until the
+    signed audio URL is ready, so long videos are slow rather than timed out.
+    A busy extractor (429) is retried after its Retry-After. On timeout the job is
+    left to finish: identical requests share it, and its result is reused.
+    Extractors without the job API are called through POST /extract instead.
+    """
+    jobs_url = _jobs_endpoint()
+    try:
+        deadline = time.monotonic() + EXTRACT_JOB_TIMEOUT
+        busy_delays = _poll_delays()
+        while True:
+            r = requests.post(jobs_url, params={"youtube_url": youtube_url, "format": EXTRACT_FORMAT}, timeout=EXTRACT_TIMEOUT)
+            if r.status_code != 429:
+                break
+            time.sleep(_busy_wait(r, busy_delays, deadline))
+        if r.status_code in (404, 405):
+            return _fetch_audio_via_extract(youtube_url)
+        r.raise_for_status()
+        job_id = r.json()["id"]
+        for delay in _poll_delays():
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f"extraction job {job_id} not done after {EXTRACT_JOB_TIMEOUT:.0f}s")
+            time.sleep(delay)
+            try:
+                r = requests.get(f"{jobs_url}/{job_id}", timeout=EXTRACT_TIMEOUT)
+                r.raise_for_status()
+            except requests.RequestException as e:
+                print(f"[extract] polling job {job_id} failed, retrying: {e}")
+                continue
+            audio_url = _job_audio_url(r.json())
+            if audio_url:
+                return audio_url
+
+    except Exception as e:
+        msg = (f"{datetime.now()}: Error retrieving youtube wave file from Azure instance. "
+               f"url={youtube_url} endpoint={jobs_url} err={e}")
+        print(msg)
+        return msg
+
+def _fetch_audio_via_extract(youtube_url: str) -> str:
+    """
+    Calls the extractor's synchronous POST /extract and returns the signed audio URL.
     - Tries POST /extract with youtube_url as a query param (your current server shape).
     - Falls back to sending youtube_url in JSON body if needed.
     - Accepts either JSON {"audio_url": "..."} or a plain string URL.
     """
-    EXTRACT_API = os.getenv("AZURE_CONTAINER_APP_FQDN") ## Fast API endpoint for youtube extraction "https://<your-app-fqdn>/extract"
-    print(f"Extract_API value: {EXTRACT_API}")
-    base = EXTRACT_API.rstrip("/")
-    endpoint = base if base.endswith("/extract") else f"{base}/extract"
-
-    payload = {"format": "wav", "sample_rate": 16000, "mono": True}
-    timeout = 90
+    endpoint = _extract_endpoint()
+    payload = EXTRACT_PAYLOAD
+    timeout = EXTRACT_TIMEOUT
 
     try:
         # 1) Preferred: youtube_url as QUERY PARAM (matches your current API)
-        r = requests.post(endpoint, params={"youtube_url": youtube_url},
+        r = requests.post(endpoint, params={"youtube_url": youtube_url, "format": EXTRACT_FORMAT},
                           json=payload, timeout=timeout)
         if r.status_code == 404 or r.status_code == 422:
             # 2) Fallback: youtube_url in JSON body (if your API switches later)
             body = {"youtube_url": youtube_url, **payload}
             r = requests.post(endpoint, json=body, timeout=timeout)
+        return _audio_url_from_response(r)
 
-        if r.status_code >= 400:
-            # log details instead of raising blindly
-            print("STATUS:", r.status_code)
-            print("HEADERS:", r.headers)
-            print("BODY:", r.text[:2000])
-            r.raise_for_status()
-
-        # Response parsing: support dict or plain string
-        ctype = r.headers.get("Content-Type", "")
-        if "application/json" in ctype:
-            data = r.json()
-            # If server validates response_model to dict
-            if isinstance(data, dict) and "audio_url" in data:
-                return data["audio_url"]
-            # If server returns plain string in JSON (rare)
-            if isinstance(data, str):
-                return data
-            raise ValueError(f"Unexpected JSON shape: {data}")
-        else:
-            # Plain text URL response_model=str
-            text = r.text.strip()
-            if text.startswith("http"):
-                return text
-            raise ValueError(f"Unexpected text response: {text[:200]}")
+    except Exception as e:
+        msg = (f"{datetime.now()}: Error retrieving youtube wave file from Azure instance. "
+               f"url={youtube_url} endpoint={endpoint} err={e}")
+        print(msg)
+        return msg
+
+async def fetch_audio_from_youtube_async(youtube_url: str) -> str:
+    """
+    Async twin of fetch_audio_from_youtube on the shared httpx.AsyncClient.
+    """
+    jobs_url = _jobs_endpoint()
+    client = _get_async_http()
+
+    try:
+        deadline = time.monotonic() + EXTRACT_JOB_TIMEOUT
+        busy_delays = _poll_delays()
+        while True:
+            r = await client.post(jobs_url, params={"youtube_url": youtube_url, "format": EXTRACT_FORMAT},
+                                  timeout=EXTRACT_TIMEOUT)
+            if r.status_code != 429:
+                break
+            await asyncio.sleep(_busy_wait(r, busy_delays, deadline))
+        if r.status_code in (404, 405):
+            return await _fetch_audio_via_extract_async(youtube_url)
+        r.raise_for_status()
+        job_id = r.json()["id"]
+        for delay in _poll_delays():
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f"extraction job {job_id} not done after {EXTRACT_JOB_TIMEOUT:.0f}s")
+            await asyncio.sleep(delay)
+            try:
+                r = await client.get(f"{jobs_url}/{job_id}", timeout=EXTRACT_TIMEOUT)
+                r.raise_for_status()
+            except httpx.HTTPError as e:
+                print(f"[extract] polling job {job_id} failed, retrying: {e}")
+                continue
+            audio_url = _job_audio_url(r.json())
+            if audio_url:
+                return audio_url
+
+    except Exception as e:
+        msg = (f"{datetime.now()}: Error retrieving youtube wave file from Azure instance. "
+               f"url={youtube_url} endpoint={jobs_url} err={e}")
+        print(msg)
+        return msg
+
+async def _fetch_audio_via_extract_async(youtube_url: str) -> str:
+    endpoint = _extract_endpoint()
+    payload = EXTRACT_PAYLOAD
+    client = _get_async_http()
+
+    try:
+        r = await client.post(endpoint, params={"youtube_url": youtube_url, "format": EXTRACT_FORMAT},
+                              json=payload, timeout=EXTRACT_TIMEOUT)
+        if r.status_code == 404 or r.status_code == 422:
+            body = {"youtube_url": youtube_url, **payload}
+            r = await client.post(endpoint, json=body, timeout=EXTRACT_TIMEOUT)
+        return _audio_url_from_response(r)
 
     except Exception as e:
         msg = (f"{datetime.now()}: Error retrieving youtube wave file from Azure instance. "
@@ -208,19 +461,27 @@ def fetch_audio_from_youtube(youtube_url: str) -> str:
         return msg
 
         
-def process_audio(upload_path, record_path, url, sys_prompt, user_prompt):
+def process_audio(upload_path, record_path, url, sys_prompt, user_prompt, use_cache: bool = True):
+    """
+    Generator wired to the Gradio button. Yields the transcript as it is decoded
+    (YouTube path, when STREAM_TRANSCRIPT is on) and finally the LLM summary.
+    Summaries are looked up in summary_cache first unless use_cache is False.
+    """
     tmp_to_cleanup = []
     audio_b64 = None
+    audio_format = "mp3"
+    summary = None
     text_input = None
     domaincheck = None
     extract_input = None
     audio_wav = None
+    audio_path = None
+    sched = scheduler.get_scheduler()
 
     try:
         # Capture start time for logging
         Starttime = datetime.now(),
         print(f"AudioChatSummarizer API call starts at {datetime.now()}"),
-        audio_path = None
         if upload_path:
             audio_path = upload_path
         elif record_path:
@@ -229,9 +490,12 @@ def process_audio(upload_path, record_path, url, sys_prompt, user_prompt):
             # Check dns resolution of the url domain
             domain = Youtubetranscription_summarizer.extract_domain(url)
             if domain:
-                domaincheck = Youtubetranscription_summarizer.nslookup(domain)  # Check DNS resolution of the domain
+                with span("dns") as s:
+                    domaincheck = Youtubetranscription_summarizer.nslookup(domain)  # Check DNS resolution of the domain
+                    s.set(outcome="ok" if domaincheck else "error")
             else:
-                return "Invalid URL format."
+                yield "Invalid URL format."
+                return
             
             if domaincheck:
                 # Check if the url is a youtube link
@@ -243,36 +507,335 @@ def process_audio(upload_path, record_path, url, sys_prompt, user_prompt):
                     #extract_input = extract(url.strip()) # Call for local testing
                     # Test wav file transcription using faster-whisper # Call for local testing
                     #audio_wav = fetch_audio_from_youtube(extract_input) # Call for local testing
-                    audio_wav = fetch_audio_from_youtube(url.strip()) # Server API call
-                    #file_path = "/Users/sayedarizvi/AudioSummarizer/Data/test.wav" # Call for local testing
-                    #audio_wav = file_path # Call for local testing
-                    #text_input = Youtubetranscription_summarizer.transcribe_faster_whisper(extract_input, model_name="base.en")# Call for local testing
-                    text_input = Youtubetranscription_summarizer.transcribe_faster_whisper(audio_wav, model_name="base.en") #Call for server testing
-                    tmp_to_cleanup.append(text_input)
+                    video_id = Youtubetranscription_summarizer.get_video_id(url.strip())
+                    text_input = _cached_transcript(video_id, use_cache)
+                    if text_input is not None:
+                        print(f"[transcript-cache] hit {video_id}; skipping extraction and transcription")
+                        yield _transcript_view(text_input["segments"], done=True)
+                    else:
+                        yield "Fetching audio from YouTube..."
+                        with span("extract") as s:
+                            audio_wav = fetch_audio_from_youtube(url.strip()) # Server API call
+                            s.set(outcome=_extract_outcome(audio_wav))
+                        #file_path = "/Users/sayedarizvi/AudioSummarizer/Data/test.wav" # Call for local testing
+                        #audio_wav = file_path # Call for local testing
+                        #text_input = Youtubetranscription_summarizer.transcribe_faster_whisper(extract_input, model_name="base.en")# Call for local testing
+                        if STREAM_TRANSCRIPT:
+                            segments = []
+                            last_push = 0.0
+                            try:
+                                with contextlib.closing(sched.iterate("transcribe", lambda: parallel_transcribe.stream_transcribe(
+                                        audio_wav, model_name=WHISPER_MODEL, vad_filter=WHISPER_VAD_FILTER))) as stream:
+                                    for seg in stream:
+                                        segments.append(seg)
+                                        # Throttle UI updates: each push resends the whole transcript
+                                        if time.monotonic() - last_push >= STREAM_UPDATE_SEC:
+                                            last_push = time.monotonic()
+                                            yield _transcript_view(segments)
+                                text_input = {"segments": segments}
+                                yield _transcript_view(segments, done=True)
+                            except Exception as e:
+                                text_input = f"Faster-Whisper transcription failed: {e}"
+                        else:
+                            text_input = sched.executor("transcribe").submit(
+                                parallel_transcribe.transcribe, audio_wav, model_name=WHISPER_MODEL, vad_filter=WHISPER_VAD_FILTER).result() #Call for server testing
+                        _store_transcript(video_id, text_input)
                 else:   
                     audio_path = download_to_temp_mp3(url.strip())
                     tmp_to_cleanup.append(audio_path)
             else:
-                return f"DNS lookup failed for {domain}"
+                yield f"DNS lookup failed for {domain}"
+                return
         if not audio_path and text_input is None:
-            return "Please provide content via upload, recording, or URL."
-        # If we have an audio file, encode it
-        if audio_path:
-            audio_b64 = encode_audio_from_path(audio_path)
-        return summarize_input(audio_b64, text_input, sys_prompt, user_prompt, Starttime)
+            yield "Please provide content via upload, recording, or URL."
+            return
+        # Look for a cached summary before encoding anything or calling Azure
+        estimate = scheduler.estimate_audio_sec(audio_path)
+        cache_key, payload_bytes, cached = sched.executor("hash", estimate).submit(
+            _summary_cache_lookup, audio_path, text_input, sys_prompt, user_prompt, use_cache).result()
+        if cached is not None:
+            yield cached
+            return
+        duration = audio_utils.probe_duration(audio_path) if audio_path else None
+        if duration and duration > audio_utils.LONG_AUDIO_SEC:
+            # Too long for one multimodal call: summarize segments concurrently, then merge
+            seg_dir, seg_paths = sched.executor("split", duration).submit(audio_utils.split_for_upload, audio_path).result()
+            tmp_to_cleanup.append(seg_dir)
+            for kind, value in _summarize_segments(seg_paths, sys_prompt, user_prompt, Starttime):
+                if kind == "progress":
+                    yield value
+                else:
+                    summary = value
+        else:
+            # If we have an audio file, encode it
+            if audio_path:
+                audio_b64, audio_format = sched.executor("encode", duration).submit(encode_for_upload, audio_path, duration).result()
+            if _needs_map_reduce(text_input):
+                yield "Long transcript: summarizing in chunks..."
+                summary = Youtubetranscription_summarizer.summarize_with_phi(
+                    text_input["segments"], sys_prompt, user_prompt, _PhiClient(Starttime))
+            else:
+                summary = summarize_input(audio_b64, text_input, sys_prompt, user_prompt, Starttime, audio_format, duration)
+        if cache_key and _is_cacheable(text_input, summary):
+            summary_cache.get_cache().put(cache_key, summary, payload_bytes)
+        yield summary
 
     except Exception as e:
-        return print(f"Error processing audio at {datetime.now()}: prompt_length={len(user_prompt)}, audio_path={audio_path}: {str(e)}")
+        print(f"Error processing audio at {datetime.now()}: prompt_length={len(user_prompt)}, audio_path={audio_path}: {str(e)}")
+        yield None
         
 
     finally:
         for p in tmp_to_cleanup:
             try:
-                if os.path.exists(p):
+                if os.path.isdir(p):
+                    shutil.rmtree(p, ignore_errors=True)
+                elif os.path.exists(p):
+                    os.remove(p)
+            except Exception:
+                pass
+
+async def process_audio_async(upload_path, record_path, url, sys_prompt, user_prompt, use_cache: bool = True):
+    """
+    Async twin of process_audio. The extractor call and Azure OpenAI are awaited;
+    whisper, hashing and base64 encoding run on the scheduler's CPU pool, blocking
+    downloads and DNS on its I/O pool. While a request waits on I/O it holds no
+    thread, so one process can keep hundreds of requests in flight.
+    """
+    tmp_to_cleanup = []
+    audio_b64 = None
+    audio_format = "mp3"
+    summary = None
+    text_input = None
+    audio_path = None
+    loop = asyncio.get_running_loop()
+    sched = scheduler.get_scheduler()
+
+    try:
+        # Capture start time for logging
+        Starttime = datetime.now(),
+        print(f"AudioChatSummarizer API call starts at {datetime.now()}")
+        if upload_path:
+            audio_path = upload_path
+        elif record_path:
+            audio_path = record_path
+        elif url and url.strip():
+            domain = Youtubetranscription_summarizer.extract_domain(url)
+            if not domain:
+                yield "Invalid URL format."
+                return
+            # getaddrinfo blocks; keep it off the event loop
+            with span("dns") as s:
+                domaincheck = await loop.run_in_executor(sched.executor("dns"), Youtubetranscription_summarizer.nslookup, domain)
+                s.set(outcome="ok" if domaincheck else "error")
+            if not domaincheck:
+                yield f"DNS lookup failed for {domain}"
+                return
+
+            if re.search(r"Youtube", url, re.IGNORECASE):
+                video_id = Youtubetranscription_summarizer.get_video_id(url.strip())
+                # The transcript and summary caches read and write disk; keep them off the event loop
+                text_input = await loop.run_in_executor(sched.executor("cache"), _cached_transcript, video_id, use_cache)
+                if text_input is not None:
+                    print(f"[transcript-cache] hit {video_id}; skipping extraction and transcription")
+                    yield _transcript_view(text_input["segments"], done=True)
+                else:
+                    yield "Fetching audio from YouTube..."
+                    with span("extract") as s:
+                        audio_wav = await fetch_audio_from_youtube_async(url.strip())
+                        s.set(outcome=_extract_outcome(audio_wav))
+                    segments = []
+                    last_push = 0.0
+                    try:
+                        # aclosing: a disconnect closes this generator, which must stop the transcription too
+                        async with contextlib.aclosing(sched.aiterate("transcribe", lambda: parallel_transcribe.stream_transcribe(
+                                audio_wav, model_name=WHISPER_MODEL, vad_filter=WHISPER_VAD_FILTER))) as stream:
+                            async for seg in stream:
+                                segments.append(seg)
+                                if STREAM_TRANSCRIPT and time.monotonic() - last_push >= STREAM_UPDATE_SEC:
+                                    last_push = time.monotonic()
+                                    yield _transcript_view(segments)
+                        text_input = {"segments": segments}
+                        if STREAM_TRANSCRIPT:
+                            yield _transcript_view(segments, done=True)
+                    except Exception as e:
+                        text_input = f"Faster-Whisper transcription failed: {e}"
+                    await loop.run_in_executor(sched.executor("cache"), _store_transcript, video_id, text_input)
+            else:
+                audio_path = await download_to_temp_mp3_async(url.strip())
+                tmp_to_cleanup.append(audio_path)
+        if not audio_path and text_input is None:
+            yield "Please provide content via upload, recording, or URL."
+            return
+        # Until ffprobe has run, order CPU work by file size so short recordings go first
+        estimate = scheduler.estimate_audio_sec(audio_path)
+        cache_key, payload_bytes, cached = await loop.run_in_executor(
+            sched.executor("hash", estimate), _summary_cache_lookup, audio_path, text_input, sys_prompt, user_prompt, use_cache)
+        if cached is not None:
+            yield cached
+            return
+        duration = await loop.run_in_executor(sched.executor("probe", estimate), audio_utils.probe_duration, audio_path) if audio_path else None
+        if duration and duration > audio_utils.LONG_AUDIO_SEC:
+            seg_dir, seg_paths = await loop.run_in_executor(sched.executor("split", duration), audio_utils.split_for_upload, audio_path)
+            tmp_to_cleanup.append(seg_dir)
+            async for kind, value in _summarize_segments_async(seg_paths, sys_prompt, user_prompt, Starttime):
+                if kind == "progress":
+                    yield value
+                else:
+                    summary = value
+        else:
+            if audio_path:
+                audio_b64, audio_format = await loop.run_in_executor(sched.executor("encode", duration), encode_for_upload, audio_path, duration)
+            if _needs_map_reduce(text_input):
+                yield "Long transcript: summarizing in chunks..."
+                # summarize_with_phi fans out on its own thread pool; wait for it off-loop
+                summary = await loop.run_in_executor(sched.executor("llm"), Youtubetranscription_summarizer.summarize_with_phi,
+                                                     text_input["segments"], sys_prompt, user_prompt, _PhiClient(Starttime))
+            else:
+                summary = await summarize_input_async(audio_b64, text_input, sys_prompt, user_prompt, Starttime, audio_format, duration)
+        if cache_key and _is_cacheable(text_input, summary):
+            await loop.run_in_executor(sched.executor("cache"), lambda: summary_cache.get_cache().put(cache_key, summary, payload_bytes))
+        yield summary
+
+    except Exception as e:
+        print(f"Error processing audio at {datetime.now()}: prompt_length={len(user_prompt)}, audio_path={audio_path}: {str(e)}")
+        yield None
+
+    finally:
+        for p in tmp_to_cleanup:
+            try:
+                if os.path.isdir(p):
+                    shutil.rmtree(p, ignore_errors=True)
+                elif os.path.exists(p):
                     os.remove(p)
             except Exception:
                 pass
 
+def _segment_prompt(user_prompt, idx: int, total: int) -> str:
+    start = (idx - 1) * audio_utils.LONG_AUDIO_SEGMENT_SEC
+    window = f"{int(start // 60):02d}:{int(start % 60):02d}"
+    return (f"{user_prompt or 'Summarize the provided content.'}\n\nThis is segment {idx} of {total} of a longer recording, "
+            f"starting at {window}. Return: bullet summary + key timestamps relative to the full recording.")
+
+def _summarize_segments(seg_paths, sys_prompt, user_prompt, Starttime):
+    """
+    Summarize audio segments concurrently (PHI_MAX_CONCURRENCY calls in flight) and
+    tree-reduce the partials. Yields ("progress", text) per finished segment, then
+    ("summary", text).
+    """
+    total = len(seg_paths)
+
+    def run(idx, path):
+        audio_b64, audio_format = encode_for_upload(path, transcode=False)
+        result = summarize_input(audio_b64, None, sys_prompt, _segment_prompt(user_prompt, idx, total), Starttime, audio_format)
+        if result is None:
+            raise RuntimeError(f"Azure OpenAI call failed for segment {idx}/{total}")
+        return result
+
+    partials = [None] * total
+    yield "progress", f"Long recording: summarizing {total} segments..."
+    with ThreadPoolExecutor(max_workers=Youtubetranscription_summarizer.PHI_MAX_CONCURRENCY) as pool:
+        futures = {pool.submit(run, idx, path): idx for idx, path in enumerate(seg_paths, 1)}
+        for done, fut in enumerate(as_completed(futures), 1):
+            partials[futures[fut] - 1] = fut.result()
+            yield "progress", f"Summarized segment {futures[fut]} ({done}/{total} done)..."
+    yield "progress", f"Merging {total} segment summaries..."
+    yield "summary", Youtubetranscription_summarizer.reduce_summaries(partials, sys_prompt, _PhiClient(Starttime),
+                                                                      final_instructions=user_prompt)
+
+async def _summarize_segments_async(seg_paths, sys_prompt, user_prompt, Starttime):
+    """Async twin of _summarize_segments on the AsyncAzureOpenAI client."""
+    loop = asyncio.get_running_loop()
+    total = len(seg_paths)
+    limit = asyncio.Semaphore(Youtubetranscription_summarizer.PHI_MAX_CONCURRENCY)
+    sched = scheduler.get_scheduler()
+
+    async def run(idx, path):
+        async with limit:
+            audio_b64, audio_format = await loop.run_in_executor(
+                sched.executor("encode", audio_utils.LONG_AUDIO_SEGMENT_SEC), functools.partial(encode_for_upload, path, transcode=False))
+            result = await summarize_input_async(audio_b64, None, sys_prompt, _segment_prompt(user_prompt, idx, total),
+                                                 Starttime, audio_format)
+        if result is None:
+            raise RuntimeError(f"Azure OpenAI call failed for segment {idx}/{total}")
+        return idx, result
+
+    partials = [None] * total
+    yield "progress", f"Long recording: summarizing {total} segments..."
+    tasks = [asyncio.ensure_future(run(idx, path)) for idx, path in enumerate(seg_paths, 1)]
+    try:
+        for done, next_done in enumerate(asyncio.as_completed(tasks), 1):
+            idx, result = await next_done
+            partials[idx - 1] = result
+            yield "progress", f"Summarized segment {idx} ({done}/{total} done)..."
+    finally:
+        for task in tasks:
+            task.cancel()
+    yield "progress", f"Merging {total} segment summaries..."
+    summary = await loop.run_in_executor(sched.executor("llm"), functools.partial(
+        Youtubetranscription_summarizer.reduce_summaries, partials, sys_prompt, _PhiClient(Starttime),
+        final_instructions=user_prompt))
+    yield "summary", summary
+
+def _cached_transcript(video_id: str, use_cache: bool):
+    if not use_cache:
+        return None
+    return transcript_cache.get_cache().get(video_id, WHISPER_MODEL, WHISPER_VAD_FILTER)
+
+def _store_transcript(video_id: str, text_input):
+    if isinstance(text_input, dict):
+        try:
+            transcript_cache.get_cache().put(video_id, WHISPER_MODEL, text_input, WHISPER_VAD_FILTER)
+        except Exception as e:
+            print(f"[transcript-cache] could not store {video_id}: {e}")
+    print(f"[whisper] model cache stats: {Youtubetranscription_summarizer.whisper_model_stats()}")
+
+def _summary_cache_lookup(audio_path, text_input, sys_prompt, user_prompt, use_cache: bool):
+    """Returns (cache_key, payload_bytes, cached_summary); key is None when caching is off."""
+    if not use_cache:
+        return None, 0, None
+    if audio_path:
+        content_hash = summary_cache.hash_file(audio_path)
+        payload_bytes = 4 * ((os.path.getsize(audio_path) + 2) // 3)  # base64 size
+    else:
+        content_hash = summary_cache.hash_text_input(text_input)
+        payload_bytes = len(json.dumps(text_input)) if not isinstance(text_input, str) else len(text_input)
+    cache_key = summary_cache.make_key(content_hash, sys_prompt, user_prompt, os.getenv("AC_MODEL_DEPLOYMENT"))
+    cached = summary_cache.get_cache().get(cache_key)
+    if cached is not None:
+        print(f"[summary-cache] hit {cache_key[:12]} stats={summary_cache.get_cache().stats()}")
+    return cache_key, payload_bytes, cached
+
+class _PhiClient:
+    """summarize(sysprompt, prompt) on top of summarize_input, for summarize_with_phi."""
+
+    def __init__(self, Starttime):
+        self.Starttime = Starttime
+
+    def summarize(self, sysprompt, prompt):
+        result = summarize_input(None, None, sysprompt, prompt, self.Starttime)
+        if result is None:
+            raise RuntimeError("Azure OpenAI call failed during map-reduce summarization")
+        return result
+
+def _needs_map_reduce(text_input) -> bool:
+    if not isinstance(text_input, dict) or not text_input.get("segments"):
+        return False
+    transcript = Youtubetranscription_summarizer.format_segments(text_input["segments"])
+    return Youtubetranscription_summarizer.estimate_tokens(transcript) > PHI_MAPREDUCE_MIN_TOKENS
+
+def _is_cacheable(text_input, summary) -> bool:
+    # Only keep real answers; skip config errors and summaries of failed transcriptions
+    if not isinstance(summary, str) or not summary.strip():
+        return False
+    if summary.startswith(("Server misconfiguration", "Error:")):
+        return False
+    return not (isinstance(text_input, str) and text_input.startswith("Faster-Whisper transcription failed"))
+
+def _transcript_view(segments, done: bool = False) -> str:
+    status = "Transcription complete, summarizing..." if done else f"Transcribing... ({len(segments)} segments so far)"
+    return f"{status}\n\n{Youtubetranscription_summarizer.format_segments(segments)}"
+
 
 # --- UI ---------------------------------------------------------------------
 
@@ -316,6 +879,7 @@ with gr.Blocks(title="Audio Summarizer") as demo:
             value=sysprompt_default,
         )
 
+    use_cache_input = gr.Checkbox(label="Use cached summary if available", value=True)
     submit_btn = gr.Button("Summarize")
     output = gr.Textbox(label="Summary", lines=12)
 
@@ -340,13 +904,41 @@ with gr.Blocks(title="Audio Summarizer") as demo:
             outputs=[],
         )
     submit_btn.click(
-        fn=process_audio,
-        inputs=[upload_audio, record_audio, url_input, sysprompt_input, userprompt_input],
+        fn=process_audio_async if ASYNC_PIPELINE else process_audio,
+        inputs=[upload_audio, record_audio, url_input, sysprompt_input, userprompt_input, use_cache_input],
         outputs=output,
-    
-    
+        api_name="process_audio",
+        # Stages queue on the scheduler's pools, so a request slot no longer pins a CPU;
+        # allow many in flight and let short jobs overtake long transcriptions there
+        concurrency_limit=ASYNC_CONCURRENCY_LIMIT if ASYNC_PIPELINE else SYNC_CONCURRENCY_LIMIT,
     )
 
 
+def build_server():
+    """
+    FastAPI app serving the UI at / and the stage metrics at /metrics on the same
+    port, so a Space (which only exposes the app port) can be scraped.
+    """
+    from fastapi import FastAPI, Response
+
+    server = FastAPI()
+
+    @server.get("/metrics")
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
+    # Registered after /metrics, or the UI mounted at / would shadow it
+    return gr.mount_gradio_app(server, demo, path="/")
+
+
 if __name__ == "__main__":
-    demo.launch()
+    # Optional extra scrape target on its own port (METRICS_PORT, 0 = off)
+    start_metrics_server()
+    # Load whisper weights in the background so the first YouTube request doesn't pay for it
+    preload = [m.strip() for m in os.getenv("WHISPER_PRELOAD", WHISPER_MODEL).split(",") if m.strip()]
+    if preload:
+        threading.Thread(target=Youtubetranscription_summarizer.warm_whisper_models, args=(preload,), daemon=True).start()
+    import uvicorn
+    uvicorn.run(build_server(), host=os.getenv("GRADIO_SERVER_NAME", "127.0.0.1"),
+                port=int(os.getenv("GRADIO_SERVER_PORT", "7860")))
@@ -0,0 +1,139 @@
+import os, glob, base64, shutil, subprocess, tempfile
+from typing import Optional, Tuple, List
+import av
+import numpy as np
+from faster_whisper import decode_audio
+
+# Pre-upload transcoding settings (override via env)
+UPLOAD_TRANSCODE = os.getenv("UPLOAD_TRANSCODE", "1") == "1"
+UPLOAD_BITRATE = os.getenv("UPLOAD_BITRATE", "32k")  # mono speech at 16 kHz
+UPLOAD_SAMPLE_RATE = int(os.getenv("UPLOAD_SAMPLE_RATE", "16000"))
+# Azure OpenAI input_audio only accepts mp3 and wav, so "speech-tuned" means low-bitrate mono mp3
+
+# Long recordings are split into segments summarized as separate calls
+LONG_AUDIO_SEC = float(os.getenv("LONG_AUDIO_SEC", "1200"))
+LONG_AUDIO_SEGMENT_SEC = float(os.getenv("LONG_AUDIO_SEGMENT_SEC", "600"))
+
+# In-memory decode for faster-whisper (16 kHz mono float32)
+PCM_SAMPLE_RATE = 16000
+PCM_READ_BYTES = 1 << 20
+PCM_MAX_SEC = float(os.getenv("PCM_MAX_SEC", str(4 * 3600)))  # longest audio decoded in memory (4 h = 0.9 GB)
+
+
+def transcode_for_speech(path: str, bitrate: str = UPLOAD_BITRATE, sample_rate: int = UPLOAD_SAMPLE_RATE) -> Optional[bytes]:
+    """
+    Transcode any audio file to mono mp3 at sample_rate/bitrate, returned as bytes
+    over a pipe (no temp file). None if ffmpeg is unavailable or fails.
+    """
+    if shutil.which("ffmpeg") is None:
+        return None
+    try:
+        return subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+             "-vn", "-ac", "1", "-ar", str(sample_rate), "-c:a", "libmp3lame", "-b:a", bitrate, "-f", "mp3", "pipe:1"],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        print(f"[upload] transcode failed for {path}: {e.stderr.decode(errors='replace').strip()[:500]}")
+        return None
+
+def _audio_format(path: str) -> str:
+    # Label what we send; Azure only understands "mp3" and "wav"
+    return "wav" if path.lower().endswith(".wav") else "mp3"
+
+def encode_audio_for_upload(path: str, transcode: bool = UPLOAD_TRANSCODE) -> Tuple[str, str]:
+    """
+    Base64 payload for the LLM's input_audio part, as (data, format).
+
+    When transcode is on, the file is re-encoded to speech-grade mono mp3 and the
+    smaller of the two encodings is sent. Original vs. sent sizes are logged.
+    """
+    original_size = os.path.getsize(path)
+    fmt = _audio_format(path)
+    payload = transcode_for_speech(path) if transcode else None
+    transcoded = payload is not None and len(payload) < original_size
+    if transcoded:
+        fmt = "mp3"
+    else:
+        with open(path, "rb") as f:
+            payload = f.read()
+    data = base64.b64encode(payload).decode("utf-8")
+    print(f"[upload] original={original_size} bytes, sent={len(payload)} bytes "
+          f"({fmt}{', transcoded' if transcoded else ''}), base64={len(data)}")
+    return data, fmt
+
+def decode_to_pcm(source: str, sample_rate: int = PCM_SAMPLE_RATE, max_sec: float = PCM_MAX_SEC) -> np.ndarray:
+    """
+    Decode a path or URL to mono float32 PCM at sample_rate, entirely in memory.
+
+    ffmpeg resamples and streams raw f32le samples over a pipe straight into a
+    numpy buffer (pre-sized from the container duration for local files, grown
+    by doubling otherwise), so nothing touches disk and there is no int16
+    intermediate copy. Falls back to faster-whisper's PyAV decoder without ffmpeg.
+    Audio longer than max_sec raises RuntimeError instead of exhausting memory.
+    """
+    if shutil.which("ffmpeg") is None:
+        return decode_audio(source, sampling_rate=sample_rate)
+    duration = probe_duration(source) if os.path.exists(source) else None
+    too_long = f"{source} is longer than {max_sec:.0f}s, the in-memory decode limit (PCM_MAX_SEC)"
+    if duration and duration > max_sec:
+        raise RuntimeError(too_long)
+    # One sample past the limit, so a full buffer means the audio went over it
+    limit = int(max_sec * sample_rate) + 1
+    buf = np.empty(min(limit, int((duration or 60) * sample_rate) + sample_rate), dtype=np.float32)
+    nbytes = 0
+    with subprocess.Popen(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", source,
+             "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "pipe:1"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        while True:
+            if nbytes == buf.nbytes:
+                if len(buf) == limit:
+                    proc.kill()
+                    raise RuntimeError(too_long)
+                grown = np.empty(min(len(buf) * 2, limit), dtype=np.float32)
+                grown[:len(buf)] = buf
+                buf = grown
+            n = proc.stdout.readinto(memoryview(buf).cast("B")[nbytes:nbytes + PCM_READ_BYTES])
+            if not n:
+                break
+            nbytes += n
+        err = proc.stderr.read()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode {source}: {err.decode(errors='replace').strip()[:500]}")
+    samples = nbytes // 4
+    # Don't pin a mostly empty buffer for the lifetime of the transcription
+    return buf[:samples] if samples * 2 > len(buf) else buf[:samples].copy()
+
+def probe_duration(path: str) -> Optional[float]:
+    """Duration in seconds from the container header, or None if unknown."""
+    try:
+        with av.open(path) as container:
+            if container.duration is not None:
+                return container.duration / av.time_base
+            stream = next((st for st in container.streams if st.type == "audio"), None)
+            if stream is not None and stream.duration is not None:
+                return float(stream.duration * stream.time_base)
+    except Exception as e:
+        print(f"[upload] could not probe duration of {path}: {e}")
+    return None
+
+def split_for_upload(path: str, segment_sec: float = LONG_AUDIO_SEGMENT_SEC, bitrate: str = UPLOAD_BITRATE,
+                     sample_rate: int = UPLOAD_SAMPLE_RATE) -> Tuple[str, List[str]]:
+    """
+    Split and transcode in one ffmpeg pass into speech-grade mono mp3 segments of
+    segment_sec. Returns (temp_dir, ordered segment paths); caller removes temp_dir.
+    """
+    out_dir = tempfile.mkdtemp(prefix="upload_segments_")
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", path,
+             "-vn", "-ac", "1", "-ar", str(sample_rate), "-c:a", "libmp3lame", "-b:a", bitrate,
+             "-f", "segment", "-segment_time", str(segment_sec), "-reset_timestamps", "1",
+             os.path.join(out_dir, "part%04d.mp3")],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+    except subprocess.CalledProcessError as e:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        raise RuntimeError(f"ffmpeg failed to split {path}: {(e.stderr or '').strip()[:500]}") from e
+    return out_dir, sorted(glob.glob(os.path.join(out_dir, "part*.mp3")))
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Headless batch summarization on top of app.process_audio_async.
+
+Reads a CSV or JSONL manifest with one recording per row:
+
+    id            optional; defaults to a digest of source + prompts
+    source        local file path, mp3 URL or YouTube URL (or use "path"/"url")
+    sys_prompt    optional override of the metadata.json system prompt
+    user_prompt   optional override of the metadata.json user prompt
+    use_cache     optional, default true
+
+Up to --io-workers items are in flight at once; while they wait on downloads,
+the extractor or Azure OpenAI they hold no thread. Whisper, hashing and
+encoding run on the scheduler's CPU pool of --cpu-workers threads, and blocking
+I/O helpers (downloads, DNS) on its I/O pool of --io-workers threads.
+
+Each finished item is appended to the output JSONL as it completes. A rerun
+with the same output skips items already recorded as "ok", so an interrupted
+batch resumes where it stopped; failed items are retried.
+
+    python batch_summarize.py manifest.csv -o results.jsonl --io-workers 32 --cpu-workers 4
+"""
+import os, re, sys, csv, json, time, asyncio, hashlib, argparse
+from datetime import datetime
+
+# Messages process_audio yields instead of a summary
+_ERROR_PREFIXES = ("Server misconfiguration", "Error:", "Invalid URL", "DNS lookup failed", "Please provide content")
+
+
+def read_manifest(path: str) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    items = []
+    for n, row in enumerate(rows, 1):
+        row = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+        source = row.get("source") or row.get("path") or row.get("url")
+        if not source:
+            raise ValueError(f"{path}: row {n} has no source/path/url")
+        use_cache = row.get("use_cache", True)
+        if isinstance(use_cache, str):
+            use_cache = use_cache.lower() not in ("0", "false", "no", "")
+        items.append({"id": row.get("id") or None, "source": source, "sys_prompt": row.get("sys_prompt") or None,
+                      "user_prompt": row.get("user_prompt") or None, "use_cache": use_cache})
+    return items
+
+def _item_id(source: str, sys_prompt: str, user_prompt: str) -> str:
+    key = "\0".join([source, sys_prompt or "", user_prompt or ""])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def completed_ids(output_path: str) -> set:
+    """Ids recorded as ok in an earlier run's output."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+def summary_status(summary) -> str:
+    """Return "ok", or "error" when process_audio ended with an error message or nothing."""
+    if not isinstance(summary, str) or not summary.strip() or summary.startswith(_ERROR_PREFIXES):
+        return "error"
+    return "ok"
+
+
+class BatchRunner:
+    """Runs manifest items through process_audio_async with bounded concurrency."""
+
+    def __init__(self, app, output_path: str, io_workers: int):
+        self.app = app
+        self.output_path = output_path
+        self.io_workers = io_workers
+        self.counts = {"ok": 0, "error": 0}
+        self._out = None
+
+    def _write(self, record: dict):
+        # One line per item, flushed so a crash loses at most the item in progress
+        self._out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._out.flush()
+        os.fsync(self._out.fileno())
+
+    async def _run_item(self, item: dict) -> dict:
+        source = item["source"]
+        is_url = source.startswith(("http://", "https://"))
+        args = (None if is_url else source, None, source if is_url else None,
+                item["sys_prompt"], item["user_prompt"])
+        is_youtube = is_url and re.search(r"Youtube", source, re.IGNORECASE)
+        summary, error, transcribed = None, None, False
+        t0 = time.perf_counter()
+        try:
+            if not is_url and not os.path.isfile(source):
+                raise FileNotFoundError(source)
+            # Intermediate values are progress/transcript updates; the last one is the summary
+            async for summary in self.app.process_audio_async(*args, use_cache=item["use_cache"]):
+                if isinstance(summary, str) and summary.startswith("Transcription complete"):
+                    transcribed = True
+            if is_youtube and self.app.STREAM_TRANSCRIPT and not transcribed:
+                # The app still summarizes the error text of a failed extraction/transcription
+                error = "YouTube extraction or transcription failed"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        status = "error" if error else summary_status(summary)
+        return {
+            "id": item["id"], "source": source, "status": status,
+            "summary": summary if status == "ok" else None,
+            "error": error or (None if status == "ok" else (summary or "no summary returned")),
+            "seconds": round(time.perf_counter() - t0, 3),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    async def run(self, items: list):
+        total = len(items)
+        limit = asyncio.Semaphore(self.io_workers)
+        started = time.perf_counter()
+
+        async def one(item):
+            async with limit:
+                record = await self._run_item(item)
+            self.counts[record["status"]] += 1
+            self._write(record)
+            done = sum(self.counts.values())
+            print(f"[batch] {done}/{total} {record['status']} {record['id']} {record['seconds']:.1f}s"
+                  + (f" ({record['error'][:120]})" if record["error"] else ""))
+
+        with open(self.output_path, "a", encoding="utf-8") as self._out:
+            await asyncio.gather(*(one(item) for item in items))
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed * 60 if elapsed else 0.0
+        print(f"[batch] finished {total} items in {elapsed:.1f}s ({rate:.1f}/min): "
+              f"ok={self.counts['ok']} error={self.counts['error']}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("manifest", help="CSV or JSONL manifest")
+    ap.add_argument("-o", "--output", default="batch_results.jsonl", help="results JSONL (also the checkpoint)")
+    ap.add_argument("--io-workers", type=int, default=16, help="items in flight / blocking I/O threads")
+    ap.add_argument("--cpu-workers", type=int, default=os.cpu_count() or 1,
+                    help="threads for whisper, hashing and encoding")
+    ap.add_argument("--sys-prompt", help="default system prompt (metadata.json if omitted)")
+    ap.add_argument("--user-prompt", help="default user prompt (metadata.json if omitted)")
+    ap.add_argument("--limit", type=int, help="process at most this many pending items")
+    args = ap.parse_args()
+
+    # The scheduler sizes its pools from the environment at import time
+    os.environ["SCHED_CPU_WORKERS"] = str(args.cpu_workers)
+    os.environ["SCHED_IO_WORKERS"] = str(args.io_workers)
+    import app
+
+    sys_prompt = args.sys_prompt or app.sysprompt_default
+    user_prompt = args.user_prompt or app.userprompt_default
+    items = read_manifest(args.manifest)
+    for item in items:
+        item["sys_prompt"] = item["sys_prompt"] or sys_prompt
+        item["user_prompt"] = item["user_prompt"] or user_prompt
+        item["id"] = str(item["id"] or _item_id(item["source"], item["sys_prompt"], item["user_prompt"]))
+    done = completed_ids(args.output)
+    pending, seen = [], set(done)
+    for item in items:
+        if item["id"] not in seen:
+            seen.add(item["id"])
+            pending.append(item)
+    skipped = len(items) - len(pending)
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"[batch] {len(items)} items in manifest, {skipped} done or duplicate, {len(pending)} to run "
+          f"(io_workers={args.io_workers}, cpu_workers={args.cpu_workers})")
+    if not pending:
+        return
+
+    runner = BatchRunner(app, args.output, args.io_workers)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(runner.run(pending))
+    finally:
+        loop.close()
+    if runner.counts["error"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Compare the extractor's output formats (wav, flac, opus) by bytes moved and
+end-to-end latency of the YouTube path after yt-dlp has downloaded the source:
+
+    transcode (ffmpeg, extractor args) -> upload to Blob -> download + decode
+    into the float32 array faster-whisper receives (audio_utils.decode_to_pcm)
+
+Transcode and decode are measured; the decode reads the file over HTTP from a
+local server. Upload/download time over the network is modelled from the byte
+count at --up-mbps / --down-mbps so runs are repeatable without Azure. Decoded
+samples are compared with the WAV output (flac must match exactly).
+
+    python benchmarks/bench_formats.py --duration 600 --repeat 3
+    python benchmarks/bench_formats.py --input talk.webm --down-mbps 50
+"""
+import os, sys, json, time, argparse, tempfile, threading, functools
+import http.server
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from extract.app.Youtubeextraction import OUTPUT_FORMATS, _single_pass_args, _ffmpeg
+from bench_single_pass import make_source
+import audio_utils
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def _serve(directory: str) -> str:
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=directory))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{srv.server_port}"
+
+def _snr_db(ref: np.ndarray, x: np.ndarray) -> float:
+    n = min(len(ref), len(x))
+    noise = np.sum((ref[:n] - x[:n]) ** 2)
+    return float("inf") if noise == 0 else round(10 * np.log10(np.sum(ref[:n] ** 2) / noise), 1)
+
+def run_format(name: str, src: str, work: str, base_url: str, sr: int, ch: int, up_mbps: float, down_mbps: float):
+    fmt = OUTPUT_FORMATS[name]
+    out = Path(work) / f"out.{sr}Hz.{ch}ch.{fmt['ext']}"
+    t0 = time.perf_counter()
+    _ffmpeg(Path(src), out, ["-vn", *fmt["args"], *_single_pass_args(sr, ch)])
+    transcode = time.perf_counter() - t0
+
+    size = out.stat().st_size
+    upload = size * 8 / (up_mbps * 1e6)
+    download = size * 8 / (down_mbps * 1e6)
+    t0 = time.perf_counter()
+    pcm = audio_utils.decode_to_pcm(f"{base_url}/{out.name}", sr)
+    decode = time.perf_counter() - t0
+    return {
+        "bytes": size,
+        "transcode_sec": round(transcode, 3),
+        "upload_sec_modelled": round(upload, 3),
+        "download_sec_modelled": round(download, 3),
+        "decode_sec": round(decode, 3),
+        "end_to_end_sec": round(transcode + upload + download + decode, 3),
+    }, pcm
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--input", help="audio/video file to convert (synthetic source if omitted)")
+    ap.add_argument("--duration", type=int, default=600, help="seconds of synthetic audio")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--formats", default=",".join(OUTPUT_FORMATS))
+    ap.add_argument("--sample-rate", type=int, default=16000)
+    ap.add_argument("--channels", type=int, default=1)
+    ap.add_argument("--up-mbps", type=float, default=200.0, help="extractor -> Blob bandwidth")
+    ap.add_argument("--down-mbps", type=float, default=100.0, help="Blob -> app bandwidth")
+    ap.add_argument("--work-dir", help="where outputs are written (default: temp dir)")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    work = args.work_dir or tempfile.mkdtemp(prefix="bench_formats_")
+    os.makedirs(work, exist_ok=True)
+    src = args.input
+    if not src:
+        src = os.path.join(work, "source.webm")
+        print(f"Generating {args.duration}s synthetic source -> {src}")
+        make_source(src, args.duration)
+    base_url = _serve(work)
+
+    results = {"input": src, "input_bytes": os.path.getsize(src), "up_mbps": args.up_mbps,
+               "down_mbps": args.down_mbps, "formats": {}}
+    reference = None
+    for name in args.formats.split(","):
+        runs = []
+        for _ in range(args.repeat):
+            run, pcm = run_format(name, src, work, base_url, args.sample_rate, args.channels,
+                                  args.up_mbps, args.down_mbps)
+            runs.append(run)
+        if reference is None and name == "wav":
+            reference = pcm
+        best = min(runs, key=lambda r: r["end_to_end_sec"])
+        best["snr_vs_wav_db"] = _snr_db(reference, pcm) if reference is not None else None
+        results["formats"][name] = {"best": best, "runs": runs}
+
+    wav_bytes = results["formats"].get("wav", {}).get("best", {}).get("bytes")
+    print(f"{'format':8s} {'bytes':>12s} {'vs wav':>7s} {'transcode':>10s} {'transfer':>9s} {'decode':>7s} {'e2e':>7s} {'snr dB':>7s}")
+    for name, r in results["formats"].items():
+        b = r["best"]
+        ratio = f"{b['bytes'] / wav_bytes:.2f}x" if wav_bytes else "-"
+        transfer = b["upload_sec_modelled"] + b["download_sec_modelled"]
+        print(f"{name:8s} {b['bytes']:>12,} {ratio:>7s} {b['transcode_sec']:>9.2f}s {transfer:>8.2f}s "
+              f"{b['decode_sec']:>6.2f}s {b['end_to_end_sec']:>6.2f}s {b['snr_vs_wav_db']!s:>7s}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of process_audio, fully offline. Azure OpenAI, the mp3
+host and the YouTube extractor are replaced by the local servers in fakes.py,
+and the inputs are synthetic speech-like recordings (10 s, 10 min and 2 h by
+default). Each input is run as an upload, an mp3 URL and a YouTube URL.
+
+Stages are timed by wrapping the functions process_audio calls:
+
+    dns         Youtubetranscription_summarizer.nslookup
+    download    app.download_to_temp_mp3
+    extract     app.fetch_audio_from_youtube(_async)
+    transcribe  parallel_transcribe.stream_transcribe (decode + whisper)
+    cache       app._summary_cache_lookup (hashing the payload)
+    split       audio_utils.split_for_upload (recordings over LONG_AUDIO_SEC)
+    encode      audio_utils.encode_audio_for_upload (transcode + base64)
+    summarize   app.summarize_input(_async), including map-reduce calls
+
+"sec" is the summed time inside a stage and "wall_sec" the span from its first
+call to its last return, so concurrent segment calls show up as sec > wall_sec.
+Whisper is stubbed at --whisper-rtf seconds per audio second unless
+--real-whisper is given (needs the WHISPER_MODEL weights available locally).
+
+    python benchmarks/bench_pipeline.py --json pipeline.json
+    python benchmarks/bench_pipeline.py --durations 10,600 --inputs youtube --repeat 3
+    python benchmarks/bench_pipeline.py --compare pipeline.json   # fail on >20% regressions
+"""
+import os, sys, json, time, asyncio, argparse, tempfile, functools, threading, statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+import fakes
+
+INPUTS = ("upload", "url", "youtube")
+
+
+class StageTimer:
+    """Collects call count, summed seconds and wall span per stage for one run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def _record(self, name: str, start: float, end: float):
+        with self._lock:
+            s = self._stages.setdefault(name, {"calls": 0, "sec": 0.0, "first": start, "last": end})
+            s["calls"] += 1
+            s["sec"] += end - start
+            s["first"] = min(s["first"], start)
+            s["last"] = max(s["last"], end)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: {"calls": s["calls"], "sec": round(s["sec"], 3), "wall_sec": round(s["last"] - s["first"], 3)}
+                    for name, s in self._stages.items()}
+
+    def wrap(self, name: str, fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self._record(name, start, time.perf_counter())
+            return timed_async
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._record(name, start, time.perf_counter())
+        return timed
+
+    def wrap_iter(self, name: str, fn):
+        # Generators: time from the call until the iterator is exhausted
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                yield from fn(*args, **kwargs)
+            finally:
+                self._record(name, start, time.perf_counter())
+        return timed
+
+    def instrument(self, app):
+        """Patch the stage functions on the modules process_audio looks them up from."""
+        import audio_utils, parallel_transcribe, Youtubetranscription_summarizer as yts
+        patches = [
+            (yts, "nslookup", "dns"),
+            (app, "download_to_temp_mp3", "download"),
+            (app, "fetch_audio_from_youtube", "extract"),
+            (app, "fetch_audio_from_youtube_async", "extract"),
+            (app, "_summary_cache_lookup", "cache"),
+            (audio_utils, "split_for_upload", "split"),
+            (audio_utils, "encode_audio_for_upload", "encode"),
+            (app, "summarize_input", "summarize"),
+            (app, "summarize_input_async", "summarize"),
+        ]
+        for module, attr, stage in patches:
+            setattr(module, attr, self.wrap(stage, getattr(module, attr)))
+        parallel_transcribe.stream_transcribe = self.wrap_iter("transcribe", parallel_transcribe.stream_transcribe)
+
+
+def _consume(app, mode: str, args: tuple, loop) -> list:
+    """Drive process_audio like Gradio does and return every value it yielded."""
+    if mode == "sync":
+        return list(app.process_audio(*args, use_cache=False))
+
+    async def run():
+        return [update async for update in app.process_audio_async(*args, use_cache=False)]
+    # One loop for the whole run: the app's pooled async clients are bound to it
+    return loop.run_until_complete(run())
+
+def run_case(app, timer: StageTimer, mode: str, kind: str, fixtures: dict, prompts: tuple, loop) -> dict:
+    sys_prompt, user_prompt = prompts
+    if kind == "upload":
+        call = (fixtures["mp3_path"], None, None, sys_prompt, user_prompt)
+    elif kind == "url":
+        call = (None, None, fixtures["mp3_url"], sys_prompt, user_prompt)
+    else:
+        call = (None, None, fixtures["youtube_url"], sys_prompt, user_prompt)
+    timer.reset()
+    t0 = time.perf_counter()
+    updates = _consume(app, mode, call, loop)
+    total = time.perf_counter() - t0
+    last = updates[-1] if updates else None
+    ok = isinstance(last, str) and last.startswith("FAKE SUMMARY")
+    if kind == "youtube":
+        # A failed extraction or transcription still ends in a (useless) summary
+        ok = ok and any(isinstance(u, str) and u.startswith("Transcription complete") for u in updates)
+    return {
+        "total_sec": round(total, 3),
+        "ok": ok,
+        "updates": len(updates),
+        "result": last[:120] if isinstance(last, str) else last,
+        "stages": timer.snapshot(),
+    }
+
+def _summarize_runs(runs: list) -> dict:
+    totals = [r["total_sec"] for r in runs]
+    stages = {}
+    for name in sorted({s for r in runs for s in r["stages"]}):
+        secs = [r["stages"][name]["sec"] for r in runs if name in r["stages"]]
+        stages[name] = {"median_sec": round(statistics.median(secs), 3), "min_sec": round(min(secs), 3)}
+    return {"median_sec": round(statistics.median(totals), 3), "min_sec": round(min(totals), 3),
+            "errors": sum(not r["ok"] for r in runs), "stages": stages}
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> list:
+    """Cases and stages whose median got slower than the baseline by more than tolerance."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["cases"]
+    slower = []
+    for case, cur in results["cases"].items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        pairs = [("total", base["summary"]["median_sec"], cur["summary"]["median_sec"])]
+        for stage, s in cur["summary"]["stages"].items():
+            if stage in base["summary"]["stages"]:
+                pairs.append((stage, base["summary"]["stages"][stage]["median_sec"], s["median_sec"]))
+        for stage, old, new in pairs:
+            # Changes under 100 ms are scheduler noise on short inputs
+            if new - old > max(0.1, old * tolerance):
+                slower.append(f"{case} {stage}: {old:.3f}s -> {new:.3f}s")
+    return slower
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--durations", default="10,600,7200", help="comma-separated seconds of synthetic audio")
+    ap.add_argument("--inputs", default=",".join(INPUTS), help="subset of upload,url,youtube")
+    ap.add_argument("--mode", choices=("async", "sync"), default="async", help="process_audio_async or process_audio")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--warmup", type=int, default=1, help="discarded runs per input on the first duration")
+    ap.add_argument("--aoai-latency", type=float, default=0.5, help="fake chat-completions latency per call (s)")
+    ap.add_argument("--aoai-sec-per-mb", type=float, default=0.2, help="extra fake latency per MB of request")
+    ap.add_argument("--extract-latency", type=float, default=0.0, help="fake extractor job duration (s)")
+    ap.add_argument("--fixture-mbps", type=float, default=0.0, help="throttle fixture downloads (0 = unthrottled)")
+    ap.add_argument("--whisper-rtf", type=float, default=0.02, help="stubbed whisper seconds per audio second")
+    ap.add_argument("--real-whisper", action="store_true", help="run the real WHISPER_MODEL instead of the stub")
+    ap.add_argument("--work-dir", help="fixtures and caches; fixtures are reused between runs")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", help="baseline JSON from an earlier run; exit 1 on regressions")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs --compare baseline")
+    args = ap.parse_args()
+
+    # Stable default: the 2 h fixtures take minutes to generate
+    work = args.work_dir or os.path.join(tempfile.gettempdir(), "bench_pipeline")
+    fixture_dir = os.path.join(work, "fixtures")
+    os.makedirs(fixture_dir, exist_ok=True)
+
+    aoai = fakes.FakeAzureOpenAI(args.aoai_latency, args.aoai_sec_per_mb).start()
+    files = fakes.FixtureServer(fixture_dir, args.fixture_mbps * 1e6 / 8).start()
+    routes = {}
+    extractor = fakes.FakeExtractor(route=lambda u: routes.get(u), latency_sec=args.extract_latency).start()
+
+    # Everything the app reads from the environment must be set before it is imported
+    os.environ.update(aoai.environ())
+    os.environ.update(extractor.environ())
+    os.environ.setdefault("SUMMARY_CACHE_DIR", os.path.join(work, "summary_cache"))
+    os.environ.setdefault("TRANSCRIPT_CACHE_DIR", os.path.join(work, "transcript_cache"))
+    os.environ.setdefault("DOWNLOAD_DIR", os.path.join(work, "downloads"))
+    import app
+    from extract.app.Youtubeextraction import OUTPUT_FORMATS
+    if not args.real_whisper:
+        fakes.stub_whisper(args.whisper_rtf)
+    timer = StageTimer()
+    timer.instrument(app)
+    loop = asyncio.new_event_loop()
+    prompts = ("You are a concise assistant.", "Summarize the recording.")
+
+    # What the extractor would upload for the YouTube input
+    fmt = OUTPUT_FORMATS[app.EXTRACT_FORMAT]
+    results = {"mode": args.mode, "extract_format": app.EXTRACT_FORMAT, "whisper": "real" if args.real_whisper else
+               f"stub rtf={args.whisper_rtf}", "aoai_latency": args.aoai_latency, "cases": {}}
+    durations = [int(d) for d in args.durations.split(",")]
+    for duration in durations:
+        mp3_name = f"speech_{duration}s.mp3"
+        extracted_name = f"speech_{duration}s.16k.{fmt['ext']}"
+        print(f"Preparing {duration}s fixtures in {fixture_dir}")
+        fakes.make_speech(os.path.join(fixture_dir, mp3_name), duration)
+        fakes.make_speech(os.path.join(fixture_dir, extracted_name), duration, 16000,
+                          codec_args=(*fmt["args"], "-ar", "16000"))
+        youtube_url = f"https://www.youtube.com/watch?v=bench{duration:06d}"
+        routes[youtube_url] = files.file_url(extracted_name)
+        fixtures = {"mp3_path": os.path.join(fixture_dir, mp3_name), "mp3_url": files.file_url(mp3_name),
+                    "youtube_url": youtube_url}
+        for kind in args.inputs.split(","):
+            case = f"{kind}/{duration}s"
+            # Client pools, the whisper model and the page cache are set up on first use
+            for _ in range(args.warmup if duration == durations[0] else 0):
+                run_case(app, timer, args.mode, kind, fixtures, prompts, loop)
+            runs = [run_case(app, timer, args.mode, kind, fixtures, prompts, loop) for _ in range(args.repeat)]
+            results["cases"][case] = {"input": kind, "duration_sec": duration, "summary": _summarize_runs(runs), "runs": runs}
+            s = results["cases"][case]["summary"]
+            stages = " ".join(f"{k}={v['median_sec']:.2f}" for k, v in s["stages"].items())
+            print(f"{case:16s} total={s['median_sec']:8.2f}s errors={s['errors']}  {stages}")
+
+    results["requests"] = {"aoai": aoai.requests, "fixtures": files.requests, "extractor": extractor.requests}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        slower = compare(results, args.compare, args.tolerance)
+        for line in slower:
+            print(f"REGRESSION {line}")
+        if slower:
+            sys.exit(1)
+    if any(c["summary"]["errors"] for c in results["cases"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
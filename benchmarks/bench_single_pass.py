@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Compare the old two-pass YouTube audio conversion with the single-pass mode.
+
+Two-pass: FFmpegExtractAudio writes a full-rate WAV, then a second ffmpeg
+resamples it to 16 kHz mono. Single-pass: FFmpegExtractAudio gets
+_single_pass_args() as output args and writes 16 kHz mono directly.
+
+The ffmpeg command lines mirror what yt-dlp runs, so no network is needed.
+A synthetic 48 kHz stereo Opus/WebM file (YouTube's usual bestaudio) is
+generated when no --input is given.
+
+    python benchmarks/bench_single_pass.py --duration 600 --repeat 3
+"""
+import os, sys, json, time, hashlib, argparse, resource, subprocess, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from extract.app.Youtubeextraction import _single_pass_args
+
+# Output args yt-dlp's FFmpegExtractAudio uses for preferredcodec="wav"
+YTDLP_WAV_ARGS = ["-vn", "-acodec", "pcm_s16le", "-movflags", "+faststart"]
+
+
+def _ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *args], check=True)
+
+def make_source(path: str, duration: int):
+    # Tone + noise, 48 kHz stereo Opus in WebM
+    _ffmpeg(
+        "-f", "lavfi", "-i", f"sine=f=220:d={duration}",
+        "-f", "lavfi", "-i", f"anoisesrc=d={duration}:a=0.05",
+        "-filter_complex", "[0][1]amix=inputs=2,aformat=channel_layouts=stereo",
+        "-ar", "48000", "-c:a", "libopus", "-b:a", "128k", path,
+    )
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _measure(fn):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_oublock
+    t0 = time.perf_counter()
+    written = fn()
+    return {
+        "seconds": round(time.perf_counter() - t0, 3),
+        "bytes_written": written,
+        # 512-byte blocks reported by the kernel for the ffmpeg children (0 on tmpfs)
+        "blocks_out": resource.getrusage(resource.RUSAGE_CHILDREN).ru_oublock - before,
+    }
+
+def two_pass(src: str, work: str, sr: int, ch: int) -> int:
+    pre, final = os.path.join(work, "pre.wav"), os.path.join(work, "two_pass.wav")
+    _ffmpeg("-i", src, *YTDLP_WAV_ARGS, pre)
+    _ffmpeg("-i", pre, "-ac", str(ch), "-ar", str(sr), final)
+    written = os.path.getsize(pre) + os.path.getsize(final)
+    os.remove(pre)
+    return written
+
+def single_pass(src: str, work: str, sr: int, ch: int) -> int:
+    final = os.path.join(work, "single_pass.wav")
+    _ffmpeg("-i", src, *YTDLP_WAV_ARGS, *_single_pass_args(sr, ch), final)
+    return os.path.getsize(final)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--input", help="audio/video file to convert (synthetic source if omitted)")
+    ap.add_argument("--duration", type=int, default=600, help="seconds of synthetic audio")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--sample-rate", type=int, default=16000)
+    ap.add_argument("--channels", type=int, default=1)
+    ap.add_argument("--work-dir", help="where outputs are written (default: temp dir)")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    work = args.work_dir or tempfile.mkdtemp(prefix="bench_single_pass_")
+    os.makedirs(work, exist_ok=True)
+    src = args.input
+    if not src:
+        src = os.path.join(work, "source.webm")
+        print(f"Generating {args.duration}s synthetic source -> {src}")
+        make_source(src, args.duration)
+
+    results = {"input": src, "input_bytes": os.path.getsize(src), "two_pass": [], "single_pass": []}
+    for i in range(args.repeat):
+        results["two_pass"].append(_measure(lambda: two_pass(src, work, args.sample_rate, args.channels)))
+        results["single_pass"].append(_measure(lambda: single_pass(src, work, args.sample_rate, args.channels)))
+
+    results["identical"] = _sha256(os.path.join(work, "two_pass.wav")) == _sha256(os.path.join(work, "single_pass.wav"))
+    for mode in ("two_pass", "single_pass"):
+        runs = results[mode]
+        best = min(r["seconds"] for r in runs)
+        print(f"{mode:12s} best={best:.3f}s bytes_written={runs[0]['bytes_written']:,} blocks_out={runs[-1]['blocks_out']}")
+    tp = min(r["seconds"] for r in results["two_pass"])
+    sp = min(r["seconds"] for r in results["single_pass"])
+    print(f"speedup x{tp / sp:.2f}, disk writes saved {results['two_pass'][0]['bytes_written'] - results['single_pass'][0]['bytes_written']:,} bytes")
+    print(f"final WAVs byte-identical: {results['identical']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
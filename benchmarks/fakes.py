@@ -0,0 +1,285 @@
+"""
+Local stand-ins for the services process_audio talks to, so the pipeline can be
+benchmarked and load-tested offline:
+
+    FakeAzureOpenAI  chat-completions endpoint with configurable latency
+    FixtureServer    static files over HTTP with HEAD, ETag and Range support
+    FakeExtractor    /jobs and /extract answering with a fixture URL
+    make_speech      synthetic speech-like audio (voiced bursts, pauses, noise)
+    stub_whisper     replaces the whisper model with a segment generator
+
+Every server binds 127.0.0.1 on a free port and runs on a daemon thread.
+"""
+import os, json, time, uuid, hashlib, threading, subprocess
+import http.server
+from email.utils import formatdate
+from typing import Optional
+from urllib.parse import urlparse, parse_qs, quote
+
+
+class _Server:
+    handler = None
+
+    def __init__(self):
+        self._srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._srv.daemon_threads = True
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _make_handler(self):
+        owner = self
+
+        class Handler(self.handler):
+            server_owner = owner
+        return Handler
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._srv.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._srv.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._srv.shutdown()
+        self._srv.server_close()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, status: int, obj):
+        self._send(status, json.dumps(obj).encode())
+
+
+# --- Azure OpenAI -------------------------------------------------------------
+
+class _AOAIHandler(_Handler):
+    def do_POST(self):
+        owner = self.server_owner
+        body = json.loads(self._body() or b"{}")
+        owner._count()
+        content = body.get("messages", [{}])[-1].get("content", "")
+        payload_bytes = len(json.dumps(content))
+        if owner.fail_every and owner.requests % owner.fail_every == 0:
+            return self._json(500, {"error": {"code": "InternalServerError", "message": "injected failure"}})
+        time.sleep(owner.latency_sec + owner.sec_per_mb * payload_bytes / 1e6)
+        text = f"FAKE SUMMARY of {payload_bytes} bytes"
+        self._json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+            "model": "fake", "choices": [{"index": 0, "finish_reason": "stop",
+                                          "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": payload_bytes // 4, "completion_tokens": 8, "total_tokens": payload_bytes // 4 + 8},
+        })
+
+
+class FakeAzureOpenAI(_Server):
+    """
+    Answers any POST as chat.completions. Each call sleeps latency_sec plus
+    sec_per_mb per MB of request content (audio uploads are slower than text);
+    fail_every=N returns HTTP 500 on every Nth call.
+    """
+    handler = _AOAIHandler
+
+    def __init__(self, latency_sec: float = 0.5, sec_per_mb: float = 0.2, fail_every: int = 0):
+        super().__init__()
+        self.latency_sec = latency_sec
+        self.sec_per_mb = sec_per_mb
+        self.fail_every = fail_every
+
+    def environ(self) -> dict:
+        """Settings that point llm_client at this server."""
+        return {"AC_OPENAI_ENDPOINT": self.url, "AC_OPENAI_API_KEY": "fake",
+                "AC_OPENAI_API_VERSION": "2024-10-21", "AC_MODEL_DEPLOYMENT": "fake-audio"}
+
+
+# --- static fixtures ----------------------------------------------------------
+
+class _FixtureHandler(_Handler):
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        owner = self.server_owner
+        owner._count()
+        path = os.path.join(owner.directory, os.path.basename(urlparse(self.path).path))
+        if not os.path.isfile(path):
+            return self._send(404, b"not found", "text/plain")
+        size = os.path.getsize(path)
+        st = os.stat(path)
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"{st.st_mtime_ns:x}-{size:x}"',
+                   "Last-Modified": formatdate(st.st_mtime, usegmt=True)}
+        start, end, status = 0, size - 1, 200
+        rng = self.headers.get("Range")
+        if rng and rng.startswith("bytes="):
+            lo, _, hi = rng[6:].split(",")[0].partition("-")
+            start = int(lo) if lo else max(0, size - int(hi))
+            end = min(int(hi), size - 1) if lo and hi else size - 1
+            if start > end:
+                return self._send(416, b"", "text/plain", {"Content-Range": f"bytes */{size}"})
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        self.send_response(status)
+        self.send_header("Content-Type", "audio/mpeg" if path.endswith(".mp3") else "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                chunk = f.read(min(1 << 20, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+                if owner.bytes_per_sec:
+                    time.sleep(len(chunk) / owner.bytes_per_sec)
+
+
+class FixtureServer(_Server):
+    """Serves files in directory; bytes_per_sec > 0 throttles each response."""
+    handler = _FixtureHandler
+
+    def __init__(self, directory: str, bytes_per_sec: float = 0):
+        super().__init__()
+        self.directory = directory
+        self.bytes_per_sec = bytes_per_sec
+
+    def file_url(self, name: str) -> str:
+        return f"{self.url}/{quote(name)}"
+
+
+# --- extractor ----------------------------------------------------------------
+
+class _ExtractHandler(_Handler):
+    def _audio_url(self, youtube_url: str) -> Optional[str]:
+        owner = self.server_owner
+        return owner.route(youtube_url) if owner.route else None
+
+    def do_POST(self):
+        owner = self.server_owner
+        owner._count()
+        self._body()
+        parsed = urlparse(self.path)
+        youtube_url = (parse_qs(parsed.query).get("youtube_url") or [""])[0]
+        audio_url = self._audio_url(youtube_url)
+        if parsed.path == "/extract":
+            time.sleep(owner.latency_sec)
+            if not audio_url:
+                return self._json(500, {"detail": f"no fixture for {youtube_url}"})
+            return self._json(200, {"audio_url": audio_url})
+        if parsed.path == "/jobs":
+            job_id = uuid.uuid4().hex
+            with owner._lock:
+                owner.jobs[job_id] = {"id": job_id, "ready_at": time.monotonic() + owner.latency_sec,
+                                      "audio_url": audio_url, "youtube_url": youtube_url}
+            return self._json(202, {"id": job_id, "status": "queued"})
+        self._json(404, {"detail": "Not Found"})
+
+    def do_GET(self):
+        owner = self.server_owner
+        owner._count()
+        parsed = urlparse(self.path)
+        if parsed.path == "/health":
+            return self._json(200, {"ok": True})
+        job = owner.jobs.get(parsed.path.rsplit("/", 1)[-1]) if parsed.path.startswith("/jobs/") else None
+        if job is None:
+            return self._json(404, {"detail": "Not Found"})
+        if time.monotonic() < job["ready_at"]:
+            return self._json(200, {"id": job["id"], "status": "running"})
+        if not job["audio_url"]:
+            return self._json(200, {"id": job["id"], "status": "failed", "error": "no fixture"})
+        self._json(200, {"id": job["id"], "status": "done", "audio_url": job["audio_url"]})
+
+    def do_DELETE(self):
+        self.server_owner._count()
+        self._json(200, {"status": "cancelled"})
+
+
+class FakeExtractor(_Server):
+    """
+    Stand-in for the FastAPI extractor. route(youtube_url) returns the audio URL
+    to hand back; jobs become done latency_sec after submission.
+    """
+    handler = _ExtractHandler
+
+    def __init__(self, route=None, latency_sec: float = 0.0):
+        super().__init__()
+        self.route = route
+        self.latency_sec = latency_sec
+        self.jobs = {}
+
+    def environ(self) -> dict:
+        return {"AZURE_CONTAINER_APP_FQDN": f"{self.url}/extract"}
+
+
+# --- audio and whisper --------------------------------------------------------
+
+# Voiced 150 Hz buzz at a ~4 Hz syllable rate, gated into phrases with pauses
+_SPEECH_EXPR = ("0.25*(sin(2*PI*150*t)+0.5*sin(2*PI*300*t)+0.25*sin(2*PI*450*t))"
+                "*(0.5+0.5*sin(2*PI*4*t))*gt(sin(2*PI*0.13*t)+0.3*sin(2*PI*0.71*t),-0.2)")
+
+def make_speech(path: str, duration: float, sample_rate: int = 22050, codec_args=("-c:a", "libmp3lame", "-b:a", "64k")):
+    """Write duration seconds of speech-like audio with background noise to path (skipped if present)."""
+    if os.path.exists(path):
+        return path
+    tmp = f"{path}.tmp{os.path.splitext(path)[1]}"
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"aevalsrc='{_SPEECH_EXPR}':s={sample_rate}:d={duration}",
+        "-f", "lavfi", "-i", f"anoisesrc=d={duration}:c=pink:r={sample_rate}:a=0.02",
+        "-filter_complex", "[0][1]amix=inputs=2:normalize=0", "-ac", "1", *codec_args, tmp,
+    ], check=True)
+    os.replace(tmp, path)
+    return path
+
+def stub_whisper(sec_per_audio_sec: float = 0.0, segment_sec: float = 5.0):
+    """
+    Replace the in-process whisper model with a generator that emits one segment
+    per segment_sec of audio, sleeping sec_per_audio_sec per second of audio
+    (the real-time factor to model). Long audio is kept on the serial path,
+    because spawned worker processes would load the real model.
+    """
+    import numpy as np
+    import Youtubetranscription_summarizer
+    import parallel_transcribe
+
+    def fake_stream(audio, *_args, **_kwargs):
+        n = len(audio) if isinstance(audio, np.ndarray) else 0
+        total = n / parallel_transcribe.SAMPLE_RATE
+        start = 0.0
+        while start < total:
+            end = min(total, start + segment_sec)
+            time.sleep((end - start) * sec_per_audio_sec)
+            digest = hashlib.sha1(f"{start:.1f}".encode()).hexdigest()[:8]
+            yield {"start": round(start, 2), "end": round(end, 2), "text": f" segment {digest} of synthetic speech."}
+            start = end
+
+    Youtubetranscription_summarizer.stream_faster_whisper = fake_stream
+    parallel_transcribe.WHISPER_PARALLEL_MIN_SEC = float("inf")
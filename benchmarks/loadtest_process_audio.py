@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Load test for the /process_audio API through gradio_client (Client.submit).
+
+Requests arrive in steps. In open mode (default) each --ramp value is an
+arrival rate in requests/second, with Poisson (exponential) inter-arrival
+times. In closed mode each value is a number of concurrent users, each
+submitting its next request as soon as the previous one returns. The input of
+each request is drawn from --mix (upload / mp3 URL / YouTube URL weights).
+
+Per step and input type the report gives completed throughput, p50/p95/p99
+latency, time to first update and error rate. The step where throughput stops
+growing while p95 climbs is the saturation point of the replica.
+
+--local launches app.demo in this process against the stand-ins in fakes.py
+(fake Azure OpenAI, fixture server, stub extractor, stubbed whisper), so one
+replica can be measured offline:
+
+    python benchmarks/loadtest_process_audio.py --local --ramp 1,2,4,8 --step-sec 60
+    python benchmarks/loadtest_process_audio.py --target http://127.0.0.1:7860/ --mode closed --ramp 4,16,64 \\
+        --upload-file talk.mp3 --mp3-url https://host/talk.mp3 --youtube-url "https://www.youtube.com/watch?v=..."
+"""
+import os, sys, json, time, random, socket, argparse, tempfile, threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from gradio_client import Client, handle_file
+from batch_summarize import summary_status
+import fakes
+
+INPUTS = ("upload", "url", "youtube")
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in INPUTS:
+            raise SystemExit(f"unknown input type {kind!r} in --mix; use {', '.join(INPUTS)}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))], 3)
+
+
+class LoadTest:
+    """Submits jobs, records one result per request and summarizes them by step and input type."""
+
+    def __init__(self, client: Client, inputs: dict, mix: dict, prompts: tuple, use_cache: bool, max_inflight: int):
+        self.client = client
+        self.inputs = inputs
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.prompts = prompts
+        self.use_cache = use_cache
+        self.max_inflight = max_inflight
+        self.results = []
+        self._lock = threading.Lock()
+        self._inflight = threading.Semaphore(max_inflight)
+        self._outstanding = []
+        self._watching = {}  # job -> record still waiting for its first update
+        threading.Thread(target=self._watch_first_updates, daemon=True).start()
+
+    def _watch_first_updates(self, interval: float = 0.05):
+        # result_callbacks only see the final value, so poll outputs() for the first yielded one
+        while True:
+            with self._lock:
+                watching = list(self._watching.items())
+            now = time.monotonic()
+            for job, record in watching:
+                if job.outputs():
+                    record["first_update"] = now
+                    with self._lock:
+                        self._watching.pop(job, None)
+            time.sleep(interval)
+
+    def _args(self, kind: str) -> tuple:
+        sys_prompt, user_prompt = self.prompts
+        if kind == "upload":
+            return (handle_file(self.inputs["upload"]), None, None, sys_prompt, user_prompt, self.use_cache)
+        return (None, None, self.inputs[kind], sys_prompt, user_prompt, self.use_cache)
+
+    def submit(self, step: int):
+        """Submit one request; returns the Job, or None when max_inflight requests are already out."""
+        if not self._inflight.acquire(blocking=False):
+            with self._lock:
+                self.results.append({"step": step, "kind": None, "status": "rejected"})
+            return None
+        kind = random.choices(self.kinds, self.weights)[0]
+        record = {"step": step, "kind": kind, "submitted": time.monotonic(), "first_update": None}
+
+        def on_done(_future):
+            # The callback gets the Job's inner future; outputs() lives on the Job itself
+            record["finished"] = time.monotonic()
+            record["latency"] = record["finished"] - record["submitted"]
+            with self._lock:
+                self._watching.pop(job, None)
+            try:
+                outputs = job.outputs()
+                final = job.result()
+                if record["first_update"] is None:
+                    record["first_update"] = record["finished"]  # only the final value was yielded
+                status = summary_status(final)
+                if kind == "youtube" and not any(isinstance(o, str) and o.startswith("Transcription complete")
+                                                 for o in outputs):
+                    status = "error"  # a failed extraction still ends in a summary of the error text
+                record["status"] = status
+                if status != "ok":
+                    record["error"] = str(final)[:200]
+            except Exception as e:
+                record["status"] = "error"
+                record["error"] = f"{type(e).__name__}: {e}"[:200]
+            with self._lock:
+                self.results.append(record)
+            self._inflight.release()
+
+        job = self.client.submit(*self._args(kind), api_name="/process_audio")
+        with self._lock:
+            self._outstanding.append(job)
+            self._watching[job] = record
+        job.add_done_callback(on_done)
+        return job
+
+    def run_open(self, rates: list, step_sec: float) -> list:
+        """Poisson arrivals at each rate in turn; returns (rate, start, end) per step."""
+        windows = []
+        for step, rate in enumerate(rates):
+            print(f"[load] step {step}: {rate} req/s for {step_sec:.0f}s")
+            start = time.monotonic()
+            end = start + step_sec
+            windows.append((rate, start, end))
+            while True:
+                wait = random.expovariate(rate) if rate > 0 else step_sec
+                if time.monotonic() + wait >= end:
+                    time.sleep(max(0.0, end - time.monotonic()))
+                    break
+                time.sleep(wait)
+                self.submit(step)
+        return windows
+
+    def run_closed(self, users: list, step_sec: float) -> list:
+        """n users submitting back to back for each step; returns (users, start, end) per step."""
+        windows = []
+        for step, n in enumerate(users):
+            print(f"[load] step {step}: {n:g} concurrent users for {step_sec:.0f}s")
+            start = time.monotonic()
+            end = start + step_sec
+            windows.append((n, start, end))
+
+            def user():
+                while time.monotonic() < end:
+                    job = self.submit(step)
+                    if job is None:
+                        time.sleep(0.05)
+                        continue
+                    try:
+                        job.result()
+                    except Exception:
+                        pass  # recorded by the done callback
+
+            threads = [threading.Thread(target=user, daemon=True) for _ in range(int(n))]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        return windows
+
+    def drain(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            jobs = list(self._outstanding)
+        for job in jobs:
+            try:
+                job.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception:
+                pass
+        with self._lock:
+            unfinished = [job for job in jobs if not job.done()]
+        for job in unfinished:
+            job.cancel()
+        return len(unfinished)
+
+    def report(self, step_windows: list) -> dict:
+        with self._lock:
+            results = list(self.results)
+        report = []
+        for step, (label, start, end) in enumerate(step_windows):
+            rows = {}
+            step_results = [r for r in results if r["step"] == step]
+            rejected = sum(r["status"] == "rejected" for r in step_results)
+            for kind in self.kinds + ["all"]:
+                rs = [r for r in step_results if r["status"] != "rejected" and (kind == "all" or r["kind"] == kind)]
+                ok = [r for r in rs if r["status"] == "ok"]
+                latencies = [r["latency"] for r in ok]
+                ttfu = [r["first_update"] - r["submitted"] for r in ok if r["first_update"]]
+                # Throughput: successful requests that finished inside this step's window
+                finished_in_window = [r for r in results if r.get("status") == "ok" and start <= r["finished"] < end
+                                      and (kind == "all" or r["kind"] == kind)]
+                rows[kind] = {
+                    "requests": len(rs),
+                    "ok": len(ok),
+                    "error_rate": round(1 - len(ok) / len(rs), 3) if rs else None,
+                    "throughput_rps": round(len(finished_in_window) / (end - start), 3),
+                    "p50_sec": _percentile(latencies, 50),
+                    "p95_sec": _percentile(latencies, 95),
+                    "p99_sec": _percentile(latencies, 99),
+                    "first_update_p50_sec": _percentile(ttfu, 50),
+                    "errors": sorted({r.get("error") for r in rs if r["status"] != "ok"} - {None})[:5],
+                }
+            report.append({"step": step, "load": label, "rejected": rejected, "by_input": rows})
+        return {"steps": report}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def launch_local(args) -> tuple:
+    """Start the fakes and app.demo in this process; returns (url, inputs)."""
+    work = args.work_dir or os.path.join(tempfile.gettempdir(), "loadtest_process_audio")
+    fixture_dir = os.path.join(work, "fixtures")
+    os.makedirs(fixture_dir, exist_ok=True)
+    aoai = fakes.FakeAzureOpenAI(args.aoai_latency, args.aoai_sec_per_mb).start()
+    files = fakes.FixtureServer(fixture_dir).start()
+    youtube_url = f"https://www.youtube.com/watch?v=load{args.local_duration:07d}"
+    routes = {}
+    extractor = fakes.FakeExtractor(route=lambda u: routes.get(u), latency_sec=args.extract_latency).start()
+    os.environ.update(aoai.environ())
+    os.environ.update(extractor.environ())
+    os.environ.setdefault("SUMMARY_CACHE_DIR", os.path.join(work, "summary_cache"))
+    os.environ.setdefault("TRANSCRIPT_CACHE_DIR", os.path.join(work, "transcript_cache"))
+    os.environ.setdefault("DOWNLOAD_DIR", os.path.join(work, "downloads"))
+    os.environ.setdefault("METRICS_PORT", "0")
+
+    import app
+    from extract.app.Youtubeextraction import OUTPUT_FORMATS
+    fakes.stub_whisper(args.whisper_rtf)
+    fmt = OUTPUT_FORMATS[app.EXTRACT_FORMAT]
+    mp3 = fakes.make_speech(os.path.join(fixture_dir, f"speech_{args.local_duration}s.mp3"), args.local_duration)
+    extracted = f"speech_{args.local_duration}s.16k.{fmt['ext']}"
+    fakes.make_speech(os.path.join(fixture_dir, extracted), args.local_duration, 16000,
+                      codec_args=(*fmt["args"], "-ar", "16000"))
+    routes[youtube_url] = files.file_url(extracted)
+
+    port = _free_port()
+    app.demo.launch(server_name="127.0.0.1", server_port=port, prevent_thread_lock=True, quiet=True)
+    inputs = {"upload": mp3, "url": files.file_url(os.path.basename(mp3)), "youtube": youtube_url}
+    return f"http://127.0.0.1:{port}/", inputs
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", help="Gradio URL or HF Space id (e.g. samir72/AudioChatTranscriber)")
+    ap.add_argument("--local", action="store_true", help="launch app.demo here with stubbed backends")
+    ap.add_argument("--mode", choices=("open", "closed"), default="open")
+    ap.add_argument("--ramp", default="0.5,1,2,4", help="req/s per step (open) or concurrent users per step (closed)")
+    ap.add_argument("--step-sec", type=float, default=60.0)
+    ap.add_argument("--mix", default="upload=1,url=1,youtube=1", help="input weights")
+    ap.add_argument("--max-inflight", type=int, default=256, help="client-side cap; arrivals beyond it are rejected")
+    ap.add_argument("--drain-sec", type=float, default=300.0, help="wait this long for outstanding jobs at the end")
+    ap.add_argument("--use-cache", action="store_true", help="let repeated inputs hit the summary/transcript caches")
+    ap.add_argument("--upload-file", help="audio file for upload requests (remote targets)")
+    ap.add_argument("--mp3-url", help="mp3 URL for url requests (remote targets)")
+    ap.add_argument("--youtube-url", help="YouTube URL for youtube requests (remote targets)")
+    ap.add_argument("--sys-prompt", default="You are a concise assistant.")
+    ap.add_argument("--user-prompt", default="Summarize the recording.")
+    ap.add_argument("--seed", type=int, help="random seed for arrivals and the input mix")
+    local = ap.add_argument_group("--local backends")
+    local.add_argument("--local-duration", type=int, default=60, help="seconds of synthetic audio per input")
+    local.add_argument("--aoai-latency", type=float, default=1.0)
+    local.add_argument("--aoai-sec-per-mb", type=float, default=0.2)
+    local.add_argument("--extract-latency", type=float, default=0.0)
+    local.add_argument("--whisper-rtf", type=float, default=0.05, help="stubbed whisper seconds per audio second")
+    local.add_argument("--work-dir")
+    ap.add_argument("--json", help="write the report to this file")
+    args = ap.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    mix = parse_mix(args.mix)
+    if args.local:
+        target, inputs = launch_local(args)
+    elif args.target:
+        target = args.target
+        inputs = {"upload": args.upload_file, "url": args.mp3_url, "youtube": args.youtube_url}
+    else:
+        ap.error("give --target or --local")
+    missing = [k for k in mix if not inputs.get(k)]
+    if missing:
+        ap.error(f"no input configured for {', '.join(missing)} (see --upload-file/--mp3-url/--youtube-url)")
+
+    ramp = [float(v) for v in args.ramp.split(",")]
+    workers = args.max_inflight if args.mode == "open" else int(max(ramp))
+    # Each job holds two executor threads (the call and its SSE reader) and the shared stream one more
+    client = Client(target, max_workers=2 * workers + 1, verbose=False)
+    test = LoadTest(client, inputs, mix, (args.sys_prompt, args.user_prompt), args.use_cache, workers)
+
+    if args.mode == "open":
+        windows = test.run_open(ramp, args.step_sec)
+    else:
+        windows = test.run_closed(ramp, args.step_sec)
+    unfinished = test.drain(args.drain_sec)
+
+    report = test.report(windows)
+    report.update(target=target, mode=args.mode, mix=mix, step_sec=args.step_sec, unfinished=unfinished)
+    unit = "req/s" if args.mode == "open" else "users"
+    print(f"{'step':>4s} {'load':>8s} {'input':8s} {'reqs':>5s} {'err%':>6s} {'thru/s':>7s} "
+          f"{'p50':>7s} {'p95':>7s} {'p99':>7s} {'ttfu50':>7s}")
+    for step in report["steps"]:
+        for kind, r in step["by_input"].items():
+            fmt = lambda v: f"{v:7.2f}" if v is not None else f"{'-':>7s}"
+            err = f"{r['error_rate'] * 100:5.1f}%" if r["error_rate"] is not None else f"{'-':>6s}"
+            print(f"{step['step']:>4d} {step['load']:>5g}{unit[:3]:>3s} {kind:8s} {r['requests']:>5d} {err} "
+                  f"{r['throughput_rps']:>7.2f} {fmt(r['p50_sec'])} {fmt(r['p95_sec'])} {fmt(r['p99_sec'])} "
+                  f"{fmt(r['first_update_p50_sec'])}")
+        if step["rejected"]:
+            print(f"{'':>4s} {step['rejected']} arrivals rejected at --max-inflight {args.max_inflight}")
+    if unfinished:
+        print(f"[load] {unfinished} jobs still running after {args.drain_sec:.0f}s drain were cancelled")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    # Gradio's server and the client's worker threads would keep the process alive
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
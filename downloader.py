@@ -0,0 +1,235 @@
+import os, json, time, hashlib, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Downloader settings (override via env)
+DOWNLOAD_PARTS = int(os.getenv("DOWNLOAD_PARTS", "4"))  # parallel range requests per file
+DOWNLOAD_MIN_PART_BYTES = int(os.getenv("DOWNLOAD_MIN_PART_BYTES", str(4 * 1024 * 1024)))
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", str(1024 * 1024)))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "30"))
+DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", os.path.join(tempfile.gettempdir(), "audiosummarizer", "downloads"))
+DOWNLOAD_PART_MAX_AGE_SEC = float(os.getenv("DOWNLOAD_PART_MAX_AGE_SEC", str(24 * 3600)))  # unfinished .part files kept
+
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Process-wide session so connections (and TLS) are reused across downloads."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=DOWNLOAD_RETRIES, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=("HEAD", "GET"))
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max(16, DOWNLOAD_PARTS * 4), max_retries=retry)
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+_url_locks = {}  # url -> [lock, holders]; dropped once no download holds or waits on it
+_url_locks_guard = threading.Lock()
+
+@contextmanager
+def _url_lock(key: str):
+    with _url_locks_guard:
+        entry = _url_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _url_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _url_locks[key]
+
+
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+def _sweep_stale_parts(max_age: float = DOWNLOAD_PART_MAX_AGE_SEC):
+    """Remove .part files and sidecars no download has touched for max_age (at most once per hour)."""
+    global _last_sweep
+    now = time.time()
+    with _sweep_lock:
+        if now - _last_sweep < min(3600, max_age):
+            return
+        _last_sweep = now
+    try:
+        names = os.listdir(DOWNLOAD_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith((".part", ".part.json", ".part.json.tmp")):
+            continue
+        path = os.path.join(DOWNLOAD_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            pass  # finished or removed by a concurrent download
+
+
+class _PartialDownload:
+    """
+    A preallocated .part file plus a JSON sidecar listing the byte ranges already
+    written, so an interrupted download resumes instead of starting over. Parts are
+    only reused when the server's validator (strong ETag or Last-Modified) matches;
+    without one the file may have changed, so the download restarts from byte 0.
+    """
+
+    def __init__(self, url: str, size: int, validator: Optional[str], suffix: str):
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:24]
+        self.path = os.path.join(DOWNLOAD_DIR, key + suffix + ".part")
+        self.state_path = self.path + ".json"
+        self.size = size
+        self.validator = validator
+        self.done = set()
+        self._lock = threading.Lock()
+
+        state = self._load_state()
+        if (validator and state and state.get("size") == size and state.get("validator") == validator
+                and os.path.exists(self.path)):
+            self.done = {tuple(r) for r in state.get("done", [])}
+        else:
+            with open(self.path, "wb") as f:
+                f.truncate(size)  # preallocate so every range can be written in place
+            self._save_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"size": self.size, "validator": self.validator, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.state_path)
+
+    def mark_done(self, byte_range):
+        with self._lock:
+            self.done.add(tuple(byte_range))
+            self._save_state()
+
+    def finish(self, final_path: str):
+        os.replace(self.path, final_path)
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+
+
+def _probe(url: str):
+    """Returns (size, validator, accepts_ranges) from a HEAD request; size is None if unknown."""
+    try:
+        r = get_session().head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+        r.raise_for_status()
+    except requests.RequestException:
+        return None, None, False
+    size = r.headers.get("Content-Length")
+    etag = r.headers.get("ETag")
+    # Weak ETags may not be used in If-Range and don't promise identical bytes
+    validator = etag if etag and not etag.startswith("W/") else r.headers.get("Last-Modified")
+    accepts_ranges = r.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return (int(size) if size and size.isdigit() else None), validator, accepts_ranges
+
+def _fetch_range(url: str, fd: int, start: int, end: int, validator: Optional[str] = None):
+    """
+    Fetch bytes [start, end] into fd at the same offsets, resuming within the range on
+    errors. With a validator the server sends the whole (new) file instead of the range
+    if it changed, which is reported like a server without range support.
+    """
+    offset = start
+    headers = {"If-Range": validator} if validator else {}
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            with get_session().get(url, headers={**headers, "Range": f"bytes={offset}-{end}"}, stream=True,
+                                   timeout=DOWNLOAD_TIMEOUT) as r:
+                if r.status_code != 206:
+                    raise RuntimeError(f"server ignored Range request (HTTP {r.status_code})")
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+            if offset > end:
+                return
+            raise requests.ConnectionError(f"range {start}-{end} ended early at {offset}")
+        except requests.RequestException as e:
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+            print(f"[download] retrying range {offset}-{end} after: {e}")
+            time.sleep(0.5 * 2 ** attempt)
+
+def _download_ranged(url: str, size: int, validator: Optional[str], final_path: str, suffix: str):
+    part = _PartialDownload(url, size, validator, suffix)
+    part_size = max(DOWNLOAD_MIN_PART_BYTES, -(-size // DOWNLOAD_PARTS))
+    ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+    todo = [r for r in ranges if r not in part.done]
+    if len(todo) < len(ranges):
+        print(f"[download] resuming {url}: {len(ranges) - len(todo)}/{len(ranges)} parts already on disk")
+
+    fd = os.open(part.path, os.O_RDWR)
+    try:
+        def fetch(byte_range):
+            _fetch_range(url, fd, *byte_range, validator=validator)
+            part.mark_done(byte_range)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_PARTS) as pool:
+            list(pool.map(fetch, todo))
+    finally:
+        os.close(fd)
+    part.finish(final_path)
+
+def _download_stream(url: str, final_path: str):
+    with get_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+        r.raise_for_status()
+        with open(final_path, "wb") as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                if chunk:
+                    f.write(chunk)
+
+def download(url: str, suffix: str = ".mp3") -> str:
+    """
+    Download url to a new temp file and return its path (caller removes it).
+
+    If the server advertises byte ranges and a Content-Length, the file is fetched
+    as DOWNLOAD_PARTS parallel ranges into a preallocated .part file that survives
+    failures and is resumed by the next call for the same URL. Otherwise it falls
+    back to a single stream with large buffers.
+    """
+    fd, final_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    t0 = time.perf_counter()
+    try:
+        size, validator, accepts_ranges = _probe(url)
+        if accepts_ranges and size and size >= 2 * DOWNLOAD_MIN_PART_BYTES:
+            mode = "ranged"
+            _sweep_stale_parts()
+            try:
+                # Serialize downloads of the same URL; they share the .part file
+                with _url_lock(url):
+                    _download_ranged(url, size, validator, final_path, suffix)
+            except RuntimeError as e:
+                # Range support was advertised but not honoured
+                print(f"[download] {e}; falling back to a single stream")
+                mode = "stream"
+                _download_stream(url, final_path)
+        else:
+            mode = "stream"
+            _download_stream(url, final_path)
+    except Exception:
+        os.remove(final_path)
+        raise
+    elapsed = time.perf_counter() - t0
+    nbytes = os.path.getsize(final_path)
+    print(f"[download] {mode} {nbytes} bytes in {elapsed:.2f}s ({nbytes / max(elapsed, 1e-6) / 1e6:.1f} MB/s) from {url}")
+    return final_path
@@ -1,14 +1,44 @@
-import os, tempfile, subprocess, re, json, shutil, time
-from fastapi import FastAPI, HTTPException
+import os, copy, asyncio, fcntl, functools, hashlib, tempfile, subprocess, re, json, shutil, time
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
 from pathlib import Path
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Literal
 import yt_dlp
 # from utils.storage import upload_and_sign   # To remove circular import issue
-from extract.utils.storage import upload_and_sign  # To remove circular import issue
+from extract.utils.storage import upload_and_sign, blob_exists, sign_blob  # To remove circular import issue
 from extract.utils.retrieve_filepath import retrieve_file_path # To get the file path of cookies.txt
-from extract.utils.cookies_refresher import start_cookies_refresher # To refresh cookies.txt periodically
+from extract.utils.cookies_refresher import start_cookies_refresher, get_status as cookies_status # To refresh cookies.txt periodically
+from extract.utils.jobqueue import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from extract.app import jobworker
+from extract.utils.stages import stage, stage_stats
+from extract.utils import probeytdlp
+from extract.utils.telemetry import span, render_metrics
 
-app = FastAPI()
+jobs = None  # JobQueue, opened at startup
+
+# Admission control for the synchronous /extract path (override via env)
+EXTRACT_MAX_INFLIGHT = int(os.getenv("EXTRACT_MAX_INFLIGHT", "4"))  # executor threads
+EXTRACT_MAX_QUEUED = int(os.getenv("EXTRACT_MAX_QUEUED", "8"))      # waiting beyond that -> 429
+EXTRACT_RETRY_AFTER_SEC = int(os.getenv("EXTRACT_RETRY_AFTER_SEC", "30"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "200"))            # queued jobs beyond that -> 429
+EXTRACT_LOCK_DIR = os.getenv("EXTRACT_LOCK_DIR", os.path.join(tempfile.gettempdir(), "extract_locks"))
+_extract_executor = ThreadPoolExecutor(max_workers=EXTRACT_MAX_INFLIGHT, thread_name_prefix="extract")
+_extract_pending = 0
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global jobs
+    jobs = JobQueue()
+    # One refresher per container: worker processes read the same cookies file
+    await asyncio.to_thread(start_cookies_refresher)
+    if jobworker.EXTRACT_WORKERS > 0:
+        jobworker.start_workers()
+    yield
+    jobworker.stop_workers()
+
+app = FastAPI(lifespan=lifespan)
 
 def ensure_ffmpeg():
     """
@@ -46,13 +76,124 @@ def _require(bin_name: str):
     if shutil.which(bin_name) is None:
         raise YTDLPError(f"Required executable '{bin_name}' not found in PATH.")
 
+def _single_pass_args(target_sr: int, target_channels: int) -> list:
+    # Output args for the WAV conversion. Pinning s16 before the downmix/resample
+    # reproduces the old two-pass chain (s16 WAV -> ffmpeg -ac/-ar) byte for byte.
+    return ["-af", "aformat=sample_fmts=s16", "-ac", str(target_channels), "-ar", str(target_sr)]
+
+def extraction_key(youtube_url: str, target_sr: int = 16000, target_channels: int = 1,
+                   audio_format: str = "wav") -> str:
+    # Deterministic blob name: one object per video and output format
+    ext = OUTPUT_FORMATS[audio_format]["ext"]
+    return f"extracts/{probeytdlp.video_id(youtube_url)}/{target_sr}Hz.{target_channels}ch.{ext}"
+
+@contextmanager
+def _single_flight(key: str):
+    # flock works across threads (separate open files) and across worker processes
+    os.makedirs(EXTRACT_LOCK_DIR, exist_ok=True)
+    path = os.path.join(EXTRACT_LOCK_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+    with open(path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _download_audio(youtube_url: str, ydl_opts: dict) -> dict:
+    """
+    Probe (cached per video) and download only the smallest audio-only format
+    that is good enough for 16 kHz speech, reusing the probed info instead of
+    extracting it a second time.
+    """
+    info = probeytdlp.probe_cached(youtube_url, ydl_opts.get("cookiefile"))
+    chosen = probeytdlp.select_speech_format(info)
+    if chosen is None:
+        print(f"[ytdlp] no audio-only format for {info.get('id')}; using {ydl_opts['format']}")
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.process_ie_result(copy.deepcopy(info), download=True)
+
+    best = probeytdlp.bestaudio_format(info)
+    duration = info.get("duration")
+    size = probeytdlp.format_size(chosen, duration) or 0
+    best_size = probeytdlp.format_size(best, duration) or 0
+    print(f"[ytdlp] {info.get('id')}: format {chosen['format_id']} ({chosen.get('acodec')} {chosen.get('abr')}k, "
+          f"{size / 1e6:.1f} MB) instead of bestaudio {best['format_id']} ({best_size / 1e6:.1f} MB), "
+          f"saved {max(0, best_size - size) / 1e6:.1f} MB")
+
+    opts = dict(ydl_opts, format=f"{chosen['format_id']}/{ydl_opts['format']}")
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        try:
+            return ydl.process_ie_result(copy.deepcopy(info), download=True)
+        except yt_dlp.utils.DownloadCancelled:
+            raise
+        except Exception as e:
+            # Cached stream URLs can expire or be refused; probe again as part of the download
+            print(f"[ytdlp] cached probe failed for {info.get('id')} ({e}); extracting again")
+            probeytdlp.forget_probe(youtube_url)
+            return ydl.extract_info(youtube_url, download=True)
+
+def _blob_ready(name: str) -> bool:
+    try:
+        return blob_exists(name)
+    except Exception as e:
+        print(f"[extract] could not check {name}, extracting again: {e}")
+        return False
+
+# Output codecs offered to clients (?format=). WAV uses the same args yt-dlp's
+# FFmpegExtractAudio did; FLAC decodes to identical samples at about half the size.
+OPUS_BITRATE = os.getenv("EXTRACT_OPUS_BITRATE", "32k")
+OUTPUT_FORMATS = {
+    "wav": {"ext": "wav", "content_type": "audio/wav", "args": ["-acodec", "pcm_s16le"]},
+    "flac": {"ext": "flac", "content_type": "audio/flac", "args": ["-acodec", "flac", "-compression_level", "5"]},
+    "opus": {"ext": "ogg", "content_type": "audio/ogg",
+             "args": ["-acodec", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip"]},
+}
+OutputFormat = Literal["wav", "flac", "opus"]
+
+def _ffmpeg(src: Path, dst: Path, args: list, quiet: bool = True):
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-i", str(src), *args, str(dst)],
+            check=True,
+            stdout=subprocess.PIPE if quiet else None,
+            stderr=subprocess.PIPE if quiet else None,
+            text=True,
+        )
+    except subprocess.CalledProcessError as e:
+        raise YTDLPError(f"ffmpeg failed to convert {src.name}: {e.stderr or e.stdout}") from e
+
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/stats")
+def stats():
+    """Queue depth per stage, in-flight /extract calls and job counts."""
+    return {
+        "stages": stage_stats(),
+        "extract": {"pending": _extract_pending, "max_inflight": EXTRACT_MAX_INFLIGHT,
+                    "max_pending": EXTRACT_MAX_INFLIGHT + EXTRACT_MAX_QUEUED},
+        "jobs": jobs.stats() if jobs else {},
+        "cookies": cookies_status(),
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus stage histograms and counters (all worker processes with PROMETHEUS_MULTIPROC_DIR)."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/cookies/status")
+def cookies_refresh_status():
+    return cookies_status()
+
+def _too_busy(detail: str) -> JSONResponse:
+    return JSONResponse(status_code=429, content={"detail": detail},
+                        headers={"Retry-After": str(EXTRACT_RETRY_AFTER_SEC)})
+
 @app.post("/extract")
-def extract(
+async def extract(
     youtube_url: str,
     out_dir: Optional[str] = None,
     target_sr: int = 16000,
@@ -60,20 +201,65 @@ def extract(
     quiet: bool = True,
     keep_intermediate: bool = False,
     progress_hook: Optional[Callable[[dict[str, Any]], None]] = None,
+    single_pass: bool = True,
+    audio_format: OutputFormat = Query("wav", alias="format"),
 ) -> str:
     """
-    Download YouTube audio via yt_dlp's Python API, extract to WAV,
-    and post-process with ffmpeg to 16 kHz mono. Returns path to the final WAV.
+    Synchronous extraction: returns the signed URL of the 16 kHz mono audio
+    (format=wav|flac|opus), or an error message. Long videos can outlive client
+    timeouts; prefer POST /jobs.
+
+    Runs on a dedicated executor of EXTRACT_MAX_INFLIGHT threads; once
+    EXTRACT_MAX_QUEUED more are waiting, new calls get 429 with Retry-After.
+    """
+    global _extract_pending
+    if _extract_pending >= EXTRACT_MAX_INFLIGHT + EXTRACT_MAX_QUEUED:
+        return _too_busy(f"{_extract_pending} extractions in progress or queued; retry later")
+    _extract_pending += 1  # only touched on the event loop thread
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_extract_executor, functools.partial(
+            run_extraction, youtube_url, out_dir, target_sr, target_channels, quiet,
+            keep_intermediate, progress_hook, single_pass, audio_format))
+    except YTDLPError as e:
+        return str(e)
+    finally:
+        _extract_pending -= 1
+
+def run_extraction(
+    youtube_url: str,
+    out_dir: Optional[str] = None,
+    target_sr: int = 16000,
+    target_channels: int = 1,
+    quiet: bool = True,
+    keep_intermediate: bool = False,
+    progress_hook: Optional[Callable[[dict[str, Any]], None]] = None,
+    single_pass: bool = True,
+    audio_format: str = "wav",
+) -> str:
+    """
+    Download YouTube audio via yt_dlp's Python API, convert it with ffmpeg to
+    16 kHz mono audio, upload it and return the signed URL. Each of the three
+    stages is bounded by its own limit (extract.utils.stages).
 
     Args
     ----
     youtube_url : str
     out_dir : Optional[str]    Directory for outputs (temp dir if None).
-    target_sr : int            Sample rate for final WAV (default 16000).
-    target_channels : int      Channels for final WAV (default 1 = mono).
+    target_sr : int            Sample rate for final audio (default 16000).
+    target_channels : int      Channels for final audio (default 1 = mono).
     quiet : bool               Suppress yt-dlp logs if True.
     keep_intermediate : bool   Keep the pre-downsampled WAV if True.
-    progress_hook : callable   Optional yt-dlp progress hook.
+    progress_hook : callable   Optional yt-dlp progress hook; also called with
+                               status "transcoding"/"uploading" between stages.
+                               Raising from it aborts the extraction.
+    single_pass : bool         Convert and resample in one ffmpeg run (no full-rate
+                               intermediate WAV). Output is byte-identical.
+    audio_format : str         "wav" (PCM), "flac" (lossless, ~half the bytes) or
+                               "opus" (lossy speech codec, smallest).
+
+    Concurrent calls for the same video and output format are coalesced: one
+    runs, the others wait and then re-sign the blob it uploaded. The blob name
+    is deterministic, so later calls skip extraction altogether.
 
     Raises
     ------
@@ -81,89 +267,158 @@ def extract(
     """
     if not youtube_url or not isinstance(youtube_url, str):
         raise ValueError("youtube_url must be a non-empty string.")
+    if audio_format not in OUTPUT_FORMATS:
+        raise YTDLPError(f"Unsupported format {audio_format!r}; use one of {', '.join(OUTPUT_FORMATS)}.")
 
+    blob_name = extraction_key(youtube_url, target_sr, target_channels, audio_format)
+    with span("extraction", format=audio_format) as s, _single_flight(blob_name):
+        if _blob_ready(blob_name):
+            print(f"[extract] reusing {blob_name}")
+            s.set(outcome="reused")
+            return sign_blob(blob_name, ttl_minutes=45)
+        return _extract_and_upload(youtube_url, blob_name, out_dir, target_sr, target_channels, quiet,
+                                   keep_intermediate, progress_hook, single_pass, OUTPUT_FORMATS[audio_format])
+
+def _extract_and_upload(youtube_url, blob_name, out_dir, target_sr, target_channels, quiet,
+                        keep_intermediate, progress_hook, single_pass, fmt: dict) -> str:
     _require("ffmpeg")  # we call ffmpeg ourselves
-    # yt-dlp bundles ffmpeg via postprocessors, but we still run ffmpeg explicitly
 
     work_dir = Path(out_dir or tempfile.mkdtemp(prefix="ytwav_")).resolve()
     work_dir.mkdir(parents=True, exist_ok=True)
 
-    # First stage: let yt-dlp extract WAV (whatever SR/channels)
     out_template = str(work_dir / "%(title).100B [%(id)s].%(ext)s")
     hooks = [progress_hook] if progress_hook else []
     ### Use cookies.txt if available
     #cookies_path = retrieve_file_path("cookies.txt")
     #cookies_path = "./app/utils/cookies.txt"
-    # Call the cookies refresher to start refreshing cookies in background
-    start_cookies_refresher()
+    # cookies.txt is kept fresh by the refresher started with the app (no blob I/O here)
     cookies_path = os.getenv("COOKIES_PATH")
     print(f"cookies_path value: {cookies_path}")
     if not cookies_path:
         cookies_path = None
         print("Cookie file NOT found in container!")
-        return f"User authentication cookie file NOT found in container! Please try again later."
+        raise YTDLPError("User authentication cookie file NOT found in container! Please try again later.")
 
     ydl_opts = {
         "cookiefile": cookies_path,
-        "format": "bestaudio/best",
+        "format": "bestaudio/worst",  # replaced by the probed speech format below
         "outtmpl": out_template,
         "noplaylist": True,
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "wav",
-                "preferredquality": "0",
-            }
-        ],
         "quiet": quiet,
         "verbose": not quiet,
         "no_warnings": quiet,
         "progress_hooks": hooks,
     }
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(youtube_url, download=True)
-    except Exception as e:
-        #raise YTDLPError(f"yt-dlp API failed: {e}") from e
-        return f"yt-dlp API failed: {e}"
-
-    # Locate the produced WAV (pre-downsampled)
-    pre_wavs = list(work_dir.glob("*.wav"))
-    if not pre_wavs:
-        #raise YTDLPError("yt-dlp completed but no WAV was found.")
-        return "yt-dlp completed but no WAV was found."
-    pre_wav = max(pre_wavs, key=lambda p: p.stat().st_mtime)
-
-    # Second stage: force 16 kHz mono via ffmpeg
-    final_wav = pre_wav.with_name(pre_wav.stem + f".{target_sr}Hz.{target_channels}ch.wav")
-    try:
-        subprocess.run(
-            [
-                "ffmpeg", "-y",
-                "-i", str(pre_wav),
-                "-ac", str(target_channels),
-                "-ar", str(target_sr),
-                str(final_wav),
-            ],
-            check=True,
-            stdout=subprocess.PIPE if quiet else None,
-            stderr=subprocess.PIPE if quiet else None,
-            text=True,
-        )
-    except subprocess.CalledProcessError as e:
-        #raise YTDLPError(f"ffmpeg failed to resample: {e.stderr or e.stdout}") from e
-        return f"ffmpeg failed to resample: {e.stderr or e.stdout}"
+    # 1) download the source audio (network)
+    with stage("download"), span("youtube_download") as s:
+        try:
+            info = _download_audio(youtube_url, ydl_opts)
+        except yt_dlp.utils.DownloadCancelled:
+            raise
+        except Exception as e:
+            raise YTDLPError(f"yt-dlp API failed: {e}") from e
+        downloads = (info or {}).get("requested_downloads") or []
+        source = Path(downloads[0]["filepath"]) if downloads and downloads[0].get("filepath") else None
+        if source is None or not source.exists():
+            raise YTDLPError("yt-dlp completed but no audio file was found.")
+        duration = info.get("duration")
+        s.set(nbytes=source.stat().st_size, audio_sec=duration)
+
+    # 2) convert to 16 kHz mono in the requested codec (CPU), run here rather
+    # than as a yt-dlp postprocessor so transcodes get their own limit.
+    for hook in hooks:
+        hook({"status": "transcoding", "filename": str(source)})
+    final_audio = source.with_name(source.stem + f".{target_sr}Hz.{target_channels}ch.{fmt['ext']}")
+    pre_wav = source.with_name(source.stem + ".wav")
+    with stage("transcode"), span("transcode", audio_sec=duration) as s:
+        if single_pass:
+            _ffmpeg(source, final_audio, ["-vn", *fmt["args"], *_single_pass_args(target_sr, target_channels)], quiet)
+        else:
+            # Two-pass: full-rate WAV first, then downmix/resample
+            _ffmpeg(source, pre_wav, ["-vn", *OUTPUT_FORMATS["wav"]["args"]], quiet)
+            _ffmpeg(pre_wav, final_audio, ["-ac", str(target_channels), "-ar", str(target_sr), *fmt["args"]], quiet)
+        s.set(nbytes=final_audio.stat().st_size)
 
     # 3) upload + sign (short-lived)
-    signed = upload_and_sign(final_wav, ttl_minutes=45)
-    
+    for hook in hooks:
+        hook({"status": "uploading", "filename": str(final_audio)})
+    with stage("upload"), span("upload", nbytes=final_audio.stat().st_size, audio_sec=duration):
+        signed = upload_and_sign(final_audio, ttl_minutes=45, blob_name=blob_name, content_type=fmt["content_type"])
+
     # Clean up intermediates if desired
     if not keep_intermediate:
-        try:
-            if pre_wav.exists() and pre_wav != final_wav:
-                pre_wav.unlink()
-        except Exception:
-            pass
-    
+        if out_dir is None:
+            # Our own temp dir: the blob is the only copy anyone needs
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            for path in (source, pre_wav):
+                try:
+                    if path.exists() and path != final_audio:
+                        path.unlink()
+                except Exception:
+                    pass
+
     return signed
+
+
+# --- job API -----------------------------------------------------------------
+
+def _job_view(job: dict) -> dict:
+    view = {k: job[k] for k in ("id", "status", "attempts", "created", "started", "finished", "error")}
+    view["youtube_url"] = job["params"].get("youtube_url")
+    if job["status"] == DONE:
+        view["audio_url"] = job["result"]
+    return view
+
+def _get_job(job_id: str) -> dict:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.post("/jobs", status_code=202)
+def submit_job(
+    youtube_url: str,
+    target_sr: int = 16000,
+    target_channels: int = 1,
+    single_pass: bool = True,
+    audio_format: OutputFormat = Query("wav", alias="format"),
+):
+    """Queue an extraction; poll GET /jobs/{id} until it is done."""
+    if not youtube_url.strip():
+        raise HTTPException(status_code=422, detail="youtube_url must be a non-empty string.")
+    queued = jobs.stats().get(QUEUED, 0)
+    if queued >= JOB_MAX_QUEUED:
+        return _too_busy(f"{queued} jobs queued; retry later")
+    # An identical job that is still queued or running is shared instead of duplicated
+    job_id, created = jobs.submit({"youtube_url": youtube_url.strip(), "target_sr": target_sr,
+                                   "target_channels": target_channels, "single_pass": single_pass,
+                                   "audio_format": audio_format},
+                                  dedupe_key=extraction_key(youtube_url.strip(), target_sr, target_channels, audio_format))
+    return {"id": job_id, "status": QUEUED if created else jobs.get(job_id)["status"]}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _job_view(_get_job(job_id))
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = _get_job(job_id)
+    if job["status"] == DONE:
+        return {"audio_url": job["result"]}
+    if job["status"] in (QUEUED, RUNNING):
+        return JSONResponse(status_code=202, content=_job_view(job), headers={"Retry-After": "2"})
+    # failed, cancelled or expired
+    raise HTTPException(status_code=410 if job["status"] != FAILED else 500, detail=job["error"] or job["status"])
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    status = jobs.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return {"id": job_id, "status": status}
+
+@app.get("/jobs")
+def job_stats():
+    return {"jobs": jobs.stats(), "workers": jobworker.EXTRACT_WORKERS}
@@ -0,0 +1,97 @@
+import os, time, threading
+import multiprocessing as mp
+from extract.utils.jobqueue import JobQueue, JOBS_DB
+from extract.utils.telemetry import mark_process_dead
+
+# Worker pool settings (override via env)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+JOB_POLL_SEC = float(os.getenv("JOB_POLL_SEC", "1"))
+JOB_HEARTBEAT_SEC = float(os.getenv("JOB_HEARTBEAT_SEC", "15"))
+JOB_SWEEP_SEC = float(os.getenv("JOB_SWEEP_SEC", "30"))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _run_job(queue: JobQueue, job: dict):
+    # Imported here: Youtubeextraction imports this module to start the pool
+    import yt_dlp
+    from extract.app.Youtubeextraction import run_extraction, YTDLPError
+
+    job_id = job["id"]
+    stop = threading.Event()
+
+    def beat():
+        # Keeps the job alive while ffmpeg or the upload run without progress callbacks
+        while not stop.wait(JOB_HEARTBEAT_SEC):
+            queue.heartbeat(job_id)
+
+    last_check = [0.0]
+    def check_cancel(_info=None):
+        # Called from yt-dlp's progress hook and between stages; raising aborts the job
+        now = time.monotonic()
+        if now - last_check[0] >= 1.0:
+            last_check[0] = now
+            if queue.cancel_requested(job_id):
+                raise yt_dlp.utils.DownloadCancelled(f"job {job_id} cancelled")
+
+    threading.Thread(target=beat, daemon=True).start()
+    try:
+        audio_url = run_extraction(**job["params"], progress_hook=check_cancel)
+        if queue.cancel_requested(job_id):
+            raise JobCancelled()
+        queue.complete(job_id, audio_url)
+        print(f"[jobs] {job_id} done")
+    except (JobCancelled, yt_dlp.utils.DownloadCancelled):
+        queue.mark_cancelled(job_id)
+        print(f"[jobs] {job_id} cancelled")
+    except YTDLPError as e:
+        # DownloadCancelled raised inside yt-dlp comes back wrapped in our error
+        if queue.cancel_requested(job_id):
+            queue.mark_cancelled(job_id)
+            print(f"[jobs] {job_id} cancelled")
+        else:
+            queue.fail(job_id, str(e))
+            print(f"[jobs] {job_id} failed: {e}")
+    except Exception as e:
+        queue.fail(job_id, f"{type(e).__name__}: {e}")
+        print(f"[jobs] {job_id} failed: {e}")
+    finally:
+        stop.set()
+
+def worker_main(worker_id: str, db_path: str = JOBS_DB):
+    """Claim and run jobs until the process is terminated."""
+    queue = JobQueue(db_path)
+    name = f"{worker_id}:{os.getpid()}"
+    print(f"[jobs] worker {name} started")
+    last_sweep = 0.0
+    while True:
+        if time.monotonic() - last_sweep >= JOB_SWEEP_SEC:
+            last_sweep = time.monotonic()
+            queue.sweep()
+        job = queue.claim(name)
+        if job is None:
+            time.sleep(JOB_POLL_SEC)
+            continue
+        print(f"[jobs] {name} running {job['id']} (attempt {job['attempts']})")
+        _run_job(queue, job)
+
+
+_procs = []
+
+def start_workers(n: int = EXTRACT_WORKERS, db_path: str = JOBS_DB):
+    # spawn: the API process may hold threads and open sockets
+    ctx = mp.get_context("spawn")
+    for i in range(n - len(_procs)):
+        p = ctx.Process(target=worker_main, args=(f"w{len(_procs)}", db_path), daemon=True)
+        p.start()
+        _procs.append(p)
+
+def stop_workers():
+    for p in _procs:
+        p.terminate()
+    for p in _procs:
+        p.join(timeout=5)
+        mark_process_dead(p.pid)
+    _procs.clear()
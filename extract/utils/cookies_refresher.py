@@ -1,4 +1,6 @@
 import os, time, hashlib, tempfile, threading
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotModifiedError
 from azure.identity import DefaultAzureCredential
 from azure.storage.blob import BlobClient
 from dotenv import load_dotenv
@@ -25,32 +27,88 @@ def _atomic_write(path: str, data: bytes):
     try: os.chmod(path, 0o600)
     except: pass
 
-def refresh_once():
-    if not ACCOUNT: 
-        print("[cookies] ACCOUNT not set"); return
-    cred = DefaultAzureCredential()  # uses ACA managed identity
-    bc = BlobClient(
-        account_url=f"https://{ACCOUNT}.blob.core.windows.net",
-        container_name=CONTAINER,
-        blob_name=BLOB,
-        credential=cred,
-    )
-    new = bc.download_blob(max_concurrency=1).readall()
+# Refresher state, reported by get_status()
+_lock = threading.Lock()
+_started = False
+_client = None
+_etag = None
+_status = {"running": False, "path": OUT_PATH, "interval_sec": REFRESH, "last_check": None,
+           "last_refresh": None, "last_update": None, "last_result": None, "last_error": None, "checks": 0, "downloads": 0}
+
+def _blob_client() -> BlobClient:
+    # One client (and credential token cache) for the life of the process
+    global _client
+    if _client is None:
+        _client = BlobClient(
+            account_url=f"https://{ACCOUNT}.blob.core.windows.net",
+            container_name=CONTAINER,
+            blob_name=BLOB,
+            credential=DefaultAzureCredential(),  # uses ACA managed identity
+        )
+    return _client
+
+def refresh_once() -> str:
+    """
+    Conditional download: while the local file is present, the request carries
+    If-None-Match with the last ETag, so an unchanged blob costs a 304 and no body.
+    Returns "updated", "unchanged" or "skipped".
+    """
+    global _etag
+    if not ACCOUNT:
+        print("[cookies] ACCOUNT not set"); return "skipped"
+    _status["checks"] += 1
+    _status["last_check"] = time.time()
+    etag = _etag if os.path.exists(OUT_PATH) else None
+    try:
+        if etag:
+            stream = _blob_client().download_blob(max_concurrency=1, etag=etag, match_condition=MatchConditions.IfModified)
+        else:
+            stream = _blob_client().download_blob(max_concurrency=1)
+        new = stream.readall()
+    except ResourceNotModifiedError:
+        _status["last_refresh"] = time.time()
+        _status["last_result"] = "unchanged"
+        return "unchanged"
+    _status["downloads"] += 1
     if not new.strip():
         print("[cookies] WARN: blob is empty; skipping")
-        return
+        _status["last_result"] = "empty"
+        return "skipped"
+    _etag = stream.properties.etag
     if _sha256(new) != _sha256(_read(OUT_PATH)):
         _atomic_write(OUT_PATH, new)
+        _status["last_update"] = time.time()
         print(f"[cookies] updated -> {OUT_PATH} (bytes={len(new)})")
+    _status["last_refresh"] = time.time()
+    _status["last_result"] = "updated"
+    return "updated"
+
+def _refresh_logged():
+    try:
+        refresh_once()
+        _status["last_error"] = None
+    except Exception as e:
+        _status["last_error"] = f"{type(e).__name__}: {e}"
+        print(f"[cookies] refresh error: {e}")
 
 def start_cookies_refresher():
+    """Idempotent: fetch once now, then refresh every REFRESH seconds on one daemon thread."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
     # initial fetch before serving traffic
-    try: refresh_once()
-    except Exception as e: print(f"[cookies] initial refresh error: {e}")
+    _refresh_logged()
     # periodic refresh
     def loop():
         while True:
             time.sleep(REFRESH)
-            try: refresh_once()
-            except Exception as e: print(f"[cookies] refresh error: {e}")
-    threading.Thread(target=loop, daemon=True).start()
+            _refresh_logged()
+    threading.Thread(target=loop, name="cookies-refresher", daemon=True).start()
+    _status["running"] = True
+
+def get_status() -> dict:
+    status = dict(_status)
+    status["file_present"] = os.path.exists(OUT_PATH)
+    return status
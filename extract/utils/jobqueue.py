@@ -0,0 +1,161 @@
+import os, json, time, uuid, sqlite3, tempfile, threading
+from typing import Optional, Tuple
+
+# Extraction job queue settings (override via env)
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(tempfile.gettempdir(), "extract_jobs.sqlite3"))
+JOB_TTL_SEC = float(os.getenv("JOB_TTL_SEC", "3600"))                # queued longer than this -> expired
+JOB_RESULT_TTL_SEC = float(os.getenv("JOB_RESULT_TTL_SEC", "2700"))  # finished jobs are kept this long (SAS lifetime)
+JOB_STALE_SEC = float(os.getenv("JOB_STALE_SEC", "60"))              # running job without heartbeat -> requeued
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, EXPIRED = "queued", "running", "done", "failed", "cancelled", "expired"
+FINISHED = (DONE, FAILED, CANCELLED, EXPIRED)
+
+
+class JobQueue:
+    """
+    Durable FIFO of extraction jobs in a SQLite file (WAL), shared by the API
+    process and the worker processes.
+
+    Workers claim jobs atomically and heartbeat while running; a job whose worker
+    stops heartbeating is requeued (up to JOB_MAX_ATTEMPTS). Cancelling a queued
+    job is immediate, a running job is flagged and its worker stops at the next
+    progress callback. Old jobs are expired and purged by sweep().
+    """
+
+    def __init__(self, path: str = JOBS_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, params TEXT NOT NULL, status TEXT NOT NULL,"
+            " result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0, worker TEXT,"
+            " created REAL NOT NULL, started REAL, finished REAL, heartbeat REAL, dedupe_key TEXT)"
+        )
+        try:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN dedupe_key TEXT")  # databases from before dedupe
+        except sqlite3.OperationalError:
+            pass
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status)")
+        self._db.commit()
+
+    def _write(self, sql: str, args=()) -> int:
+        with self._lock:
+            cur = self._db.execute(sql, args)
+            self._db.commit()
+            return cur.rowcount
+
+    def submit(self, params: dict, dedupe_key: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        Queue a job. Returns (job_id, created); with a dedupe_key, a queued or
+        running job with the same key is returned instead of adding another.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")  # serializes submitters across processes
+            try:
+                if dedupe_key:
+                    row = self._db.execute(
+                        "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY created LIMIT 1",
+                        (dedupe_key, QUEUED, RUNNING)).fetchone()
+                    if row:
+                        self._db.commit()
+                        return row["id"], False
+                job_id = uuid.uuid4().hex
+                self._db.execute("INSERT INTO jobs (id, params, status, created, dedupe_key) VALUES (?, ?, ?, ?, ?)",
+                                 (job_id, json.dumps(params), QUEUED, time.time(), dedupe_key))
+                self._db.commit()
+                return job_id, True
+            except Exception:
+                self._db.rollback()
+                raise
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def claim(self, worker: str) -> Optional[dict]:
+        """Atomically move the oldest queued job to running and return it."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started = ?, heartbeat = ?, attempts = attempts + 1"
+                " WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1)"
+                " RETURNING *",
+                (RUNNING, worker, now, now, QUEUED),
+            ).fetchone()
+            self._db.commit()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def heartbeat(self, job_id: str):
+        self._write("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = ?", (time.time(), job_id, RUNNING))
+
+    def complete(self, job_id: str, result: str):
+        self._finish(job_id, DONE, result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, FAILED, error=error)
+
+    def mark_cancelled(self, job_id: str):
+        self._finish(job_id, CANCELLED, error="cancelled")
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        self._write("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ? AND status = ?",
+                    (status, result, error, time.time(), job_id, RUNNING))
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job; returns its status afterwards, or None if unknown."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = ?, error = 'cancelled', finished = ? WHERE id = ? AND status = ?",
+                             (CANCELLED, now, job_id, QUEUED))
+            self._db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+            self._db.commit()
+            row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def sweep(self) -> dict:
+        """Requeue jobs of dead workers, expire stale queued jobs and purge old finished ones."""
+        now = time.time()
+        with self._lock:
+            requeued = self._db.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat < ? AND attempts < ?"
+                " AND cancel_requested = 0",
+                (QUEUED, RUNNING, now - JOB_STALE_SEC, JOB_MAX_ATTEMPTS)).rowcount
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = 'worker stopped responding', finished = ?"
+                " WHERE status = ? AND heartbeat < ?",
+                (FAILED, now, RUNNING, now - JOB_STALE_SEC))
+            expired = self._db.execute(
+                "UPDATE jobs SET status = ?, error = 'expired in queue', finished = ? WHERE status = ? AND created < ?",
+                (EXPIRED, now, QUEUED, now - JOB_TTL_SEC)).rowcount
+            purged = self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND finished < ?",
+                (*FINISHED, now - JOB_RESULT_TTL_SEC)).rowcount
+            self._db.commit()
+        if requeued or expired or purged:
+            print(f"[jobs] sweep: requeued={requeued} expired={expired} purged={purged}")
+        return {"requeued": requeued, "expired": expired, "purged": purged}
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
@@ -1,6 +1,14 @@
 #!/usr/bin/env python3
-import yt_dlp, traceback, sys, os
+import yt_dlp, traceback, sys, os, time, hashlib, threading
+from collections import OrderedDict
 from http.cookiejar import MozillaCookieJar
+from typing import Optional
+from yt_dlp.extractor.youtube import YoutubeIE
+
+# Cached metadata probe + speech format selection (override via env)
+YTDLP_PROBE_TTL_SEC = float(os.getenv("YTDLP_PROBE_TTL_SEC", "1800"))  # stream URLs in the info expire after hours
+YTDLP_PROBE_CACHE_MAX = int(os.getenv("YTDLP_PROBE_CACHE_MAX", "256"))
+YTDLP_MIN_ABR = float(os.getenv("YTDLP_MIN_ABR", "48"))  # kbps; plenty for 16 kHz mono speech
 
 class YDLLogger:
     def debug(self, msg): print("[DEBUG]", msg)
@@ -43,6 +51,78 @@ def probe(url, cookies=None):
         # also dump any HTML/diagnostic text if available in exception text
         print("Exception message:", str(e))
 
+def video_id(url: str) -> str:
+    vid = YoutubeIE.get_temp_id(url) if YoutubeIE.suitable(url) else None
+    return vid or hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+
+_probe_cache = OrderedDict()  # video id -> (probed_at, info)
+_probe_lock = threading.Lock()
+
+def probe_cached(url: str, cookies: Optional[str] = None, ttl_sec: float = YTDLP_PROBE_TTL_SEC) -> dict:
+    """
+    extract_info(download=False), cached per video ID for ttl_sec. Raises on
+    failure. Callers must not mutate the returned dict (copy it first).
+    """
+    key = video_id(url)
+    now = time.time()
+    with _probe_lock:
+        hit = _probe_cache.get(key)
+        if hit and now - hit[0] <= ttl_sec:
+            _probe_cache.move_to_end(key)
+            return hit[1]
+    opts = {"quiet": True, "no_warnings": True, "noplaylist": True, "cachedir": False}
+    if cookies:
+        opts["cookiefile"] = cookies
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    with _probe_lock:
+        _probe_cache[key] = (time.time(), info)
+        _probe_cache.move_to_end(key)
+        while len(_probe_cache) > YTDLP_PROBE_CACHE_MAX:
+            _probe_cache.popitem(last=False)
+    return info
+
+def forget_probe(url: str):
+    with _probe_lock:
+        _probe_cache.pop(video_id(url), None)
+
+def _abr(f: dict) -> float:
+    return f.get("abr") or f.get("tbr") or 0.0
+
+def format_size(f: dict, duration: Optional[float]) -> Optional[float]:
+    # Exact or approximate size in bytes, else estimated from bitrate x duration
+    size = f.get("filesize") or f.get("filesize_approx")
+    if not size and _abr(f) and duration:
+        size = _abr(f) * 1000 / 8 * duration
+    return size
+
+def select_speech_format(info: dict, min_abr: float = YTDLP_MIN_ABR) -> Optional[dict]:
+    """
+    Smallest audio-only format with abr >= min_abr (the best audio-only one if
+    none reach it). Video formats are never considered; None if there is no
+    audio-only format at all.
+    """
+    duration = info.get("duration")
+    audio = [f for f in info.get("formats") or []
+             if f.get("vcodec") in (None, "none") and f.get("acodec") not in (None, "none")
+             and not str(f.get("format_id", "")).startswith("sb")]
+    if not audio:
+        return None
+    # Prefer plain HTTP(S) over HLS/DASH fragments when both exist
+    direct = [f for f in audio if f.get("protocol") in ("http", "https")]
+    audio = direct or audio
+    good = [f for f in audio if _abr(f) >= min_abr]
+    if not good:
+        return max(audio, key=_abr)
+    return min(good, key=lambda f: (format_size(f, duration) or float("inf"), _abr(f)))
+
+def bestaudio_format(info: dict) -> Optional[dict]:
+    # What "bestaudio" would have picked, for reporting bytes saved
+    audio = [f for f in info.get("formats") or [] if f.get("vcodec") in (None, "none") and f.get("acodec") not in (None, "none")]
+    return max(audio, key=_abr) if audio else None
+
+
 if __name__ == "__main__":
     cookies = None
     if len(sys.argv) > 1:
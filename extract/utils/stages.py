@@ -0,0 +1,66 @@
+import os, time, threading
+from contextlib import contextmanager
+
+# Per-stage concurrency limits for one extractor process (override via env)
+EXTRACT_MAX_DOWNLOADS = int(os.getenv("EXTRACT_MAX_DOWNLOADS", "4"))                       # network bound
+EXTRACT_MAX_TRANSCODES = int(os.getenv("EXTRACT_MAX_TRANSCODES", str(os.cpu_count() or 1)))  # ffmpeg, CPU bound
+EXTRACT_MAX_UPLOADS = int(os.getenv("EXTRACT_MAX_UPLOADS", "4"))                           # blob upload bandwidth
+
+
+class StageLimiter:
+    """
+    Bounds how many requests are inside one pipeline stage at a time. Callers
+    beyond the limit block in slot() until a running one leaves; waiting and
+    active counts are kept for queue-depth reporting.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self._sem = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.wait_seconds = 0.0
+
+    @contextmanager
+    def slot(self):
+        t0 = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        self._sem.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.active += 1
+            self.wait_seconds += time.monotonic() - t0
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+            self._sem.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "avg_wait_sec": round(self.wait_seconds / self.completed, 3) if self.completed else 0.0,
+            }
+
+
+STAGES = {
+    "download": StageLimiter("download", EXTRACT_MAX_DOWNLOADS),
+    "transcode": StageLimiter("transcode", EXTRACT_MAX_TRANSCODES),
+    "upload": StageLimiter("upload", EXTRACT_MAX_UPLOADS),
+}
+
+def stage(name: str):
+    return STAGES[name].slot()
+
+def stage_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in STAGES.items()}
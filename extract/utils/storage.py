@@ -1,42 +1,145 @@
 from dotenv import load_dotenv
-import os, uuid
+import os, uuid, threading
 from datetime import datetime, timedelta, timezone
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
 from azure.identity import ManagedIdentityCredential, DefaultAzureCredential
 from azure.storage.blob import (
-    BlobServiceClient, generate_blob_sas, BlobSasPermissions
+    BlobServiceClient, generate_blob_sas, BlobSasPermissions, ContentSettings
 )
 
 load_dotenv()
 ACCOUNT_NAME = os.getenv("AZURE_STORAGE_ACCOUNT","ytstore7135")
 CONTAINER = os.getenv("AZURE_BLOB_CONTAINER","audio")
+# Optional: connection string (e.g. Azurite locally); SAS is then signed with the account key
+CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+
+# Client tuning (override via env)
+STORAGE_UDK_LIFETIME_SEC = int(os.getenv("STORAGE_UDK_LIFETIME_SEC", str(2 * 3600)))
+STORAGE_UDK_MARGIN_SEC = int(os.getenv("STORAGE_UDK_MARGIN_SEC", "300"))  # refresh this long before a SAS would outlive the key
+STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", "4"))  # parallel blocks per upload
+STORAGE_BLOCK_SIZE = int(os.getenv("STORAGE_BLOCK_SIZE", str(4 * 1024 * 1024)))
+STORAGE_SINGLE_PUT_MAX = int(os.getenv("STORAGE_SINGLE_PUT_MAX", str(8 * 1024 * 1024)))  # larger files go in blocks
+STORAGE_POOL_SIZE = int(os.getenv("STORAGE_POOL_SIZE", "32"))
 
 # Use Managed Identity in Azure; locally DefaultAzureCredential also works
 def _credential():
     # Tries MI in Azure; falls back to developer creds locally
     return DefaultAzureCredential(exclude_interactive_browser_credential=False)
 
-def _svc_client():
-    url = f"https://{ACCOUNT_NAME}.blob.core.windows.net"
-    return BlobServiceClient(account_url=url, credential=_credential())
-
-def upload_and_sign(local_path: str, ttl_minutes: int = 45) -> str:
-    svc = _svc_client()
-    name = f"{uuid.uuid4()}/{os.path.basename(local_path)}"
-    blob = svc.get_blob_client(container=CONTAINER, blob=name)
-    with open(local_path, "rb") as f:
-        blob.upload_blob(f, overwrite=True, content_type="audio/wav")
-
-    # Get User Delegation Key (no account key needed)
-    udk = svc.get_user_delegation_key(
-        key_start_time=datetime.now(timezone.utc) - timedelta(minutes=5),
-        key_expiry_time=datetime.now(timezone.utc) + timedelta(hours=2),
-    )
-    sas = generate_blob_sas(
-        account_name=ACCOUNT_NAME,
-        container_name=CONTAINER,
-        blob_name=name,
-        user_delegation_key=udk,
-        permission=BlobSasPermissions(read=True),
-        expiry=datetime.now(timezone.utc) + timedelta(minutes=ttl_minutes),
-    )
-    return f"{blob.url}?{sas}"
+
+class BlobStore:
+    """
+    Process-wide access to the audio container. The credential (and its token
+    cache), the BlobServiceClient (and its connection pool) and the user
+    delegation key are created once and reused; the key is renewed only when a
+    new SAS would outlive it. Large files are uploaded as parallel blocks.
+    """
+
+    def __init__(self, account_name: str = ACCOUNT_NAME, container: str = CONTAINER,
+                 connection_string: Optional[str] = CONNECTION_STRING):
+        self.account_name = account_name
+        self.container = container
+        self.connection_string = connection_string
+        self._lock = threading.Lock()
+        self._svc = None
+        self._udk = None
+        self._udk_expiry = None
+        self.udk_requests = 0
+        self.udk_reuses = 0
+
+    @property
+    def svc(self) -> BlobServiceClient:
+        with self._lock:
+            if self._svc is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=STORAGE_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                options = dict(
+                    transport=RequestsTransport(session=session, session_owner=False),
+                    max_block_size=STORAGE_BLOCK_SIZE,
+                    max_single_put_size=STORAGE_SINGLE_PUT_MAX,
+                )
+                if self.connection_string:
+                    self._svc = BlobServiceClient.from_connection_string(self.connection_string, **options)
+                    self.account_name = self._svc.account_name
+                else:
+                    url = f"https://{self.account_name}.blob.core.windows.net"
+                    self._svc = BlobServiceClient(account_url=url, credential=_credential(), **options)
+            return self._svc
+
+    def _delegation_key(self, valid_until: datetime):
+        # A SAS signed with a delegation key stops working when the key expires
+        with self._lock:
+            if self._udk is not None and self._udk_expiry - timedelta(seconds=STORAGE_UDK_MARGIN_SEC) >= valid_until:
+                self.udk_reuses += 1
+                return self._udk
+        now = datetime.now(timezone.utc)
+        expiry = max(now + timedelta(seconds=STORAGE_UDK_LIFETIME_SEC), valid_until + timedelta(seconds=STORAGE_UDK_MARGIN_SEC))
+        udk = self.svc.get_user_delegation_key(key_start_time=now - timedelta(minutes=5), key_expiry_time=expiry)
+        with self._lock:
+            self._udk, self._udk_expiry = udk, expiry
+            self.udk_requests += 1
+        return udk
+
+    def sign(self, name: str, ttl_minutes: int = 45) -> str:
+        """Read-only SAS URL for a blob."""
+        svc = self.svc
+        expiry = datetime.now(timezone.utc) + timedelta(minutes=ttl_minutes)
+        if self.connection_string:
+            auth = {"account_key": svc.credential.account_key}
+        else:
+            auth = {"user_delegation_key": self._delegation_key(expiry)}
+        sas = generate_blob_sas(
+            account_name=self.account_name,
+            container_name=self.container,
+            blob_name=name,
+            permission=BlobSasPermissions(read=True),
+            expiry=expiry,
+            **auth,
+        )
+        return f"{svc.get_blob_client(container=self.container, blob=name).url}?{sas}"
+
+    def upload(self, local_path: str, name: str, content_type: str = "audio/wav"):
+        blob = self.svc.get_blob_client(container=self.container, blob=name)
+        with open(local_path, "rb") as f:
+            blob.upload_blob(f, length=os.path.getsize(local_path), overwrite=True,
+                             content_settings=ContentSettings(content_type=content_type),
+                             max_concurrency=STORAGE_UPLOAD_CONCURRENCY)
+
+    def exists(self, name: str) -> bool:
+        return self.svc.get_blob_client(container=self.container, blob=name).exists()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"udk_requests": self.udk_requests, "udk_reuses": self.udk_reuses,
+                    "udk_expiry": self._udk_expiry.isoformat() if self._udk_expiry else None}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> BlobStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+        return _store
+
+def upload_and_sign(local_path: str, ttl_minutes: int = 45, blob_name: Optional[str] = None,
+                    content_type: str = "audio/wav") -> str:
+    """Upload a file (under blob_name, or a fresh uuid prefix) and return a read-only SAS URL."""
+    name = blob_name or f"{uuid.uuid4()}/{os.path.basename(local_path)}"
+    store = get_store()
+    store.upload(local_path, name, content_type)
+    return store.sign(name, ttl_minutes)
+
+def blob_exists(name: str) -> bool:
+    return get_store().exists(name)
+
+def sign_blob(name: str, ttl_minutes: int = 45) -> str:
+    """Fresh read-only SAS URL for an existing blob."""
+    return get_store().sign(name, ttl_minutes)
@@ -0,0 +1,130 @@
+import os, time, threading
+from contextlib import contextmanager
+from typing import Optional
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, start_http_server,
+)
+
+# Telemetry settings (override via env)
+TELEMETRY_LOG = os.getenv("TELEMETRY_LOG", "0") == "1"  # print one line per finished span
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))       # extra standalone /metrics port for the Gradio app; 0 = off
+# Set PROMETHEUS_MULTIPROC_DIR (before start) when spans are recorded in several processes,
+# e.g. the extractor's job workers; /metrics then aggregates all of them.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+_BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+
+STAGE_SECONDS = Histogram("audiosummarizer_stage_seconds", "Wall time of one pipeline stage call",
+                          ["stage", "outcome"], buckets=_SECONDS_BUCKETS)
+STAGE_BYTES = Histogram("audiosummarizer_stage_bytes", "Bytes moved or produced by one stage call",
+                        ["stage"], buckets=_BYTES_BUCKETS)
+AUDIO_SECONDS = Counter("audiosummarizer_stage_audio_seconds", "Seconds of audio processed per stage", ["stage"])
+# Wall time of the spans that reported audio, so audio_seconds / audio_wall_seconds is the
+# real-time factor of a stage (e.g. whisper throughput per node)
+AUDIO_WALL_SECONDS = Counter("audiosummarizer_stage_audio_wall_seconds",
+                             "Wall seconds of stage calls that reported an audio duration", ["stage"])
+IN_PROGRESS = Gauge("audiosummarizer_stage_in_progress", "Stage calls currently running", ["stage"],
+                    multiprocess_mode="livesum")
+
+
+class Span:
+    """One timed stage call; set bytes, audio_sec or outcome before it ends."""
+
+    def __init__(self, stage: str, nbytes: Optional[int] = None, audio_sec: Optional[float] = None, **attrs):
+        self.stage = stage
+        self.bytes = nbytes
+        self.audio_sec = audio_sec
+        self.outcome = "ok"
+        self.attrs = attrs
+        self.seconds = None
+
+    def set(self, nbytes: Optional[int] = None, audio_sec: Optional[float] = None, outcome: Optional[str] = None, **attrs):
+        if nbytes is not None:
+            self.bytes = nbytes
+        if audio_sec is not None:
+            self.audio_sec = audio_sec
+        if outcome is not None:
+            self.outcome = outcome
+        self.attrs.update(attrs)
+
+    def _finish(self, seconds: float):
+        self.seconds = seconds
+        STAGE_SECONDS.labels(self.stage, self.outcome).observe(seconds)
+        if self.bytes is not None:
+            STAGE_BYTES.labels(self.stage).observe(self.bytes)
+        # Partial (cancelled/failed) calls would credit the whole file for part of the time
+        if self.audio_sec and self.outcome == "ok":
+            AUDIO_SECONDS.labels(self.stage).inc(self.audio_sec)
+            AUDIO_WALL_SECONDS.labels(self.stage).inc(seconds)
+        if TELEMETRY_LOG:
+            extra = "".join(f" {k}={v}" for k, v in self.attrs.items())
+            audio = f" audio_sec={self.audio_sec:.1f} x{self.audio_sec / seconds:.1f}" if self.audio_sec and seconds else ""
+            print(f"[span] {self.stage} {self.outcome} sec={seconds:.3f} bytes={self.bytes}{audio}{extra}")
+
+def observe(stage: str, seconds: float, outcome: str = "ok"):
+    """Record a duration measured elsewhere, e.g. time spent queued for a worker."""
+    STAGE_SECONDS.labels(stage, outcome).observe(seconds)
+
+@contextmanager
+def span(stage: str, nbytes: Optional[int] = None, audio_sec: Optional[float] = None, **attrs):
+    """
+    Time a stage call and record it in the stage histograms/counters. An
+    exception marks the span outcome "error" and is re-raised.
+
+        with span("download") as s:
+            path = download(url)
+            s.set(nbytes=os.path.getsize(path))
+    """
+    s = Span(stage, nbytes, audio_sec, **attrs)
+    gauge = IN_PROGRESS.labels(stage)
+    gauge.inc()
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except GeneratorExit:
+        s.outcome = "cancelled"  # a streaming consumer stopped early
+        raise
+    except BaseException:
+        s.outcome = "error"
+        raise
+    finally:
+        gauge.dec()
+        s._finish(time.perf_counter() - t0)
+
+
+def _registry():
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def mark_process_dead(pid: int):
+    """Drop a stopped worker's live gauges from the multiprocess aggregate."""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+def render_metrics():
+    """(body, content_type) in the Prometheus text format, for a /metrics route."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+_server_lock = threading.Lock()
+_server_started = False
+
+def start_metrics_server(port: int = METRICS_PORT) -> bool:
+    """Serve /metrics on its own port (idempotent); False when disabled or the port is taken."""
+    global _server_started
+    with _server_lock:
+        if _server_started or not port:
+            return _server_started
+        try:
+            start_http_server(port, registry=_registry())
+        except OSError as e:
+            print(f"[telemetry] metrics server not started on port {port}: {e}")
+            return False
+        _server_started = True
+    print(f"[telemetry] metrics on http://0.0.0.0:{port}/metrics")
+    return True
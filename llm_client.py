@@ -0,0 +1,89 @@
+import os, threading, importlib.util
+import httpx
+from openai import AzureOpenAI, AsyncAzureOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+# HTTP settings for the shared Azure OpenAI client (override via env)
+AOAI_MAX_CONNECTIONS = int(os.getenv("AOAI_MAX_CONNECTIONS", "20"))
+AOAI_MAX_KEEPALIVE = int(os.getenv("AOAI_MAX_KEEPALIVE", "10"))
+AOAI_KEEPALIVE_SEC = float(os.getenv("AOAI_KEEPALIVE_SEC", "120"))
+AOAI_CONNECT_TIMEOUT_SEC = float(os.getenv("AOAI_CONNECT_TIMEOUT_SEC", "10"))
+AOAI_TIMEOUT_SEC = float(os.getenv("AOAI_TIMEOUT_SEC", "300"))  # long audio can take minutes
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+AOAI_HTTP2 = os.getenv("AOAI_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+
+def _config() -> tuple:
+    return (
+        os.getenv("AC_OPENAI_ENDPOINT"),
+        os.getenv("AC_OPENAI_API_KEY"),
+        os.getenv("AC_OPENAI_API_VERSION"),
+    )
+
+def _http_settings() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=AOAI_MAX_CONNECTIONS,
+            max_keepalive_connections=AOAI_MAX_KEEPALIVE,
+            keepalive_expiry=AOAI_KEEPALIVE_SEC,
+        ),
+        "timeout": httpx.Timeout(AOAI_TIMEOUT_SEC, connect=AOAI_CONNECT_TIMEOUT_SEC),
+        "http2": AOAI_HTTP2,
+    }
+
+
+class _ClientHolder:
+    """
+    Keeps one long-lived client (and its connection pool) per process and rebuilds
+    it only when the endpoint, key or API version in the environment change.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._client = None
+        self._config = None
+
+    def get(self):
+        config = _config()
+        with self._lock:
+            if self._client is None or config != self._config:
+                old = self._client
+                endpoint, api_key, api_version = config
+                self._client = self._factory(endpoint, api_key, api_version)
+                self._config = config
+                print(f"[llm] created Azure OpenAI client for {endpoint} (http2={AOAI_HTTP2})")
+                if old is not None and not isinstance(old, AsyncAzureOpenAI):
+                    try:
+                        old.close()
+                    except Exception:
+                        pass
+            return self._client
+
+
+def _make_client(endpoint, api_key, api_version) -> AzureOpenAI:
+    return AzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        http_client=DefaultHttpxClient(**_http_settings()),
+    )
+
+_sync_holder = _ClientHolder(_make_client)
+
+def get_client() -> AzureOpenAI:
+    return _sync_holder.get()
+
+def _make_async_client(endpoint, api_key, api_version) -> AsyncAzureOpenAI:
+    return AsyncAzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        http_client=DefaultAsyncHttpxClient(**_http_settings()),
+    )
+
+# The async client is tied to the event loop that first uses it (Gradio's main loop).
+# A replaced async client is left for garbage collection since close() must be awaited.
+_async_holder = _ClientHolder(_make_async_client)
+
+def get_async_client() -> AsyncAzureOpenAI:
+    return _async_holder.get()
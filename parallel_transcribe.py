@@ -0,0 +1,184 @@
+import os, sys, types, threading
+from multiprocessing.context import SpawnContext, SpawnProcess
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Iterator
+import numpy as np
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+import Youtubetranscription_summarizer
+import audio_utils
+from extract.utils.telemetry import span
+
+SAMPLE_RATE = 16000
+
+# Long-audio settings (override via env)
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", str(os.cpu_count() or 1)))
+WHISPER_PARALLEL_MIN_SEC = float(os.getenv("WHISPER_PARALLEL_MIN_SEC", "600"))  # shorter audio stays serial
+WHISPER_CHUNK_SEC = float(os.getenv("WHISPER_CHUNK_SEC", "300"))
+WHISPER_MIN_CHUNK_SEC = float(os.getenv("WHISPER_MIN_CHUNK_SEC", "30"))
+WHISPER_CHUNK_OVERLAP_SEC = float(os.getenv("WHISPER_CHUNK_OVERLAP_SEC", "2"))
+
+
+def plan_chunks(n_samples: int, speech: list, target_sec: float, overlap_sec: float = WHISPER_CHUNK_OVERLAP_SEC,
+                sr: int = SAMPLE_RATE) -> list:
+    """
+    Split [0, n_samples) into chunks of roughly target_sec, cutting in the middle of
+    VAD silences where possible. Returns (start, end, keep_from, keep_to) in samples:
+    the worker decodes [start, end) and keeps segments whose midpoint falls in
+    [keep_from, keep_to). Cuts with no nearby silence get overlap_sec of context on
+    both sides so words on the boundary are decoded whole by one of the two chunks.
+    """
+    target = int(target_sec * sr)
+    overlap = int(overlap_sec * sr)
+    # Candidate cut points: middle of every gap between speech regions
+    gaps = [(speech[i]["end"] + speech[i + 1]["start"]) // 2 for i in range(len(speech) - 1)]
+
+    cuts = []  # (position, forced)
+    cursor = 0
+    while n_samples - cursor > target * 1.5:
+        ideal = cursor + target
+        window = [g for g in gaps if cursor + target // 2 <= g <= cursor + target * 3 // 2]
+        if window:
+            cut = min(window, key=lambda g: abs(g - ideal))
+            cuts.append((cut, False))
+        else:
+            cut = ideal
+            cuts.append((cut, True))
+        cursor = cut
+
+    bounds = [(0, False)] + cuts + [(n_samples, False)]
+    chunks = []
+    for (keep_from, forced_lo), (keep_to, forced_hi) in zip(bounds, bounds[1:]):
+        start = max(0, keep_from - overlap) if forced_lo else keep_from
+        end = min(n_samples, keep_to + overlap) if forced_hi else keep_to
+        chunks.append((start, end, keep_from, keep_to))
+    return chunks
+
+
+# --- worker side -------------------------------------------------------------
+
+# spawn re-runs the parent's __main__ in each worker as __mp_main__; when that is
+# app.py, every worker would import Gradio and build the UI. Workers only need this
+# module, so hide __main__ while a worker is launched.
+_slim_main = types.ModuleType("__main__")
+_launch_lock = threading.Lock()
+
+class _WorkerProcess(SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        with _launch_lock:
+            main = sys.modules["__main__"]
+            sys.modules["__main__"] = _slim_main
+            try:
+                return SpawnProcess._Popen(process_obj)
+            finally:
+                sys.modules["__main__"] = main
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+_worker_config = {}
+
+def _init_worker(model_name: str, device: str, compute_type: str, cpu_threads: int):
+    # A worker process decodes one chunk at a time, so one model replica is enough
+    _worker_config.update(model_name=model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads,
+                          num_workers=1)
+    # Load the model once per worker, before the first chunk arrives. A failure here would
+    # break the whole pool, so leave it to the first chunk to raise a readable error.
+    try:
+        Youtubetranscription_summarizer.get_whisper_model(**_worker_config)
+    except Exception as e:
+        print(f"[whisper] worker warm-up failed: {e}")
+
+def _transcribe_chunk(audio: np.ndarray, start_sec: float, keep_from_sec: float, keep_to_sec: float,
+                      vad_filter: bool, vad_parameters: Optional[dict]) -> list:
+    out = []
+    for seg in Youtubetranscription_summarizer.stream_faster_whisper(
+            audio, vad_filter=vad_filter, vad_parameters=vad_parameters, **_worker_config):
+        seg = {"start": seg["start"] + start_sec, "end": seg["end"] + start_sec, "text": seg["text"]}
+        # Drop segments that belong to the neighbouring chunk's overlap
+        if keep_from_sec <= (seg["start"] + seg["end"]) / 2 < keep_to_sec:
+            out.append(seg)
+    return out
+
+
+# --- parent side -------------------------------------------------------------
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_pool(workers: int, model_name: str, device: str, compute_type: str) -> ProcessPoolExecutor:
+    # One long-lived pool per model config so worker models stay warm between requests
+    key = (workers, model_name, device, compute_type)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn: CTranslate2/OpenMP state does not survive fork()
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=_WorkerContext(),
+                initializer=_init_worker,
+                initargs=(model_name, device, compute_type, cpu_threads),
+            )
+            _pools[key] = pool
+        return pool
+
+def stream_transcribe(source, model_name: str = "base.en", vad_filter: bool = True,
+                      vad_parameters: Optional[dict] = None, workers: int = WHISPER_WORKERS,
+                      device: str = Youtubetranscription_summarizer.WHISPER_DEVICE,
+                      compute_type: str = Youtubetranscription_summarizer.WHISPER_COMPUTE_TYPE) -> Iterator[dict]:
+    """
+    Yield transcript segments for a path, URL or 16 kHz float32 array.
+
+    Audio longer than WHISPER_PARALLEL_MIN_SEC is split at VAD silences and the
+    chunks are transcribed across a process pool (one model per worker); segments
+    come back in order with global timestamps. Shorter audio, or workers <= 1,
+    uses the in-process model.
+    """
+    # Decode once, in memory; the model and the workers only ever see arrays
+    if isinstance(source, np.ndarray):
+        audio = source
+    else:
+        with span("decode") as s:
+            audio = audio_utils.decode_to_pcm(source, SAMPLE_RATE)
+            s.set(nbytes=audio.nbytes, audio_sec=len(audio) / SAMPLE_RATE)
+    duration = len(audio) / SAMPLE_RATE
+    # Spans the whole stream: wall time / audio seconds is whisper's real-time factor
+    with span("transcribe", nbytes=audio.nbytes, audio_sec=duration, model=model_name):
+        if workers <= 1 or duration < WHISPER_PARALLEL_MIN_SEC:
+            yield from Youtubetranscription_summarizer.stream_faster_whisper(
+                audio, model_name, vad_filter=vad_filter, vad_parameters=vad_parameters)
+            return
+
+        speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=500))
+        # Enough chunks to keep every worker busy, but not so small that context suffers
+        target_sec = max(WHISPER_MIN_CHUNK_SEC, min(WHISPER_CHUNK_SEC, duration / workers))
+        chunks = plan_chunks(len(audio), speech, target_sec)
+        print(f"[whisper] parallel transcription: {duration:.0f}s audio, {len(chunks)} chunks, {workers} workers")
+
+        pool = _get_pool(workers, model_name, device, compute_type)
+        futures = [
+            pool.submit(_transcribe_chunk, audio[start:end], start / SAMPLE_RATE, keep_from / SAMPLE_RATE,
+                        keep_to / SAMPLE_RATE, vad_filter, vad_parameters)
+            for start, end, keep_from, keep_to in chunks
+        ]
+        try:
+            for fut in futures:
+                yield from fut.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool on the next request
+            with _pools_lock:
+                _pools.pop((workers, model_name, device, compute_type), None)
+            raise
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+def transcribe(source, model_name: str = "base.en", vad_filter: bool = True, vad_parameters: Optional[dict] = None,
+               workers: int = WHISPER_WORKERS):
+    # Same return shape as Youtubetranscription_summarizer.transcribe_faster_whisper
+    try:
+        return {"segments": list(stream_transcribe(source, model_name, vad_filter, vad_parameters, workers))}
+    except Exception as e:
+        return f"Faster-Whisper transcription failed: {e}"
@@ -0,0 +1,236 @@
+import os, time, heapq, queue, asyncio, functools, itertools, threading
+from concurrent.futures import Executor, Future
+from typing import Optional
+from extract.utils.telemetry import observe
+
+# Stage scheduler settings (override via env)
+SCHED_CPU_WORKERS = int(os.getenv("SCHED_CPU_WORKERS", str(os.cpu_count() or 1)))  # whisper, transcoding, hashing
+SCHED_IO_WORKERS = int(os.getenv("SCHED_IO_WORKERS", "64"))  # downloads, DNS, blocking extractor/LLM waits
+# CPU workers whisper may hold at once; the rest stay free for short encode/hash/probe work
+SCHED_TRANSCRIBE_SLOTS = int(os.getenv("SCHED_TRANSCRIBE_SLOTS", str(max(1, SCHED_CPU_WORKERS - 1))))
+# Queue handicap per minute of audio: a 60 min job is ordered as if it arrived 6 min later
+SCHED_SEC_PER_AUDIO_MIN = float(os.getenv("SCHED_SEC_PER_AUDIO_MIN", "6"))
+SCHED_UNKNOWN_AUDIO_SEC = float(os.getenv("SCHED_UNKNOWN_AUDIO_SEC", "600"))  # assumed when the length isn't known yet
+
+# Which pool each pipeline stage runs on
+STAGE_LANES = {
+    "transcribe": "cpu", "encode": "cpu", "split": "cpu", "probe": "cpu", "hash": "cpu",
+    "download": "io", "dns": "io", "extract": "io", "llm": "io", "cache": "io",
+}
+
+_MP3_BYTES_PER_SEC = 16000  # 128 kbps
+_DONE = object()
+
+
+def estimate_audio_sec(path: Optional[str]) -> Optional[float]:
+    """Rough audio length from the file size, for ordering before ffprobe has run."""
+    try:
+        return os.path.getsize(path) / _MP3_BYTES_PER_SEC if path else None
+    except OSError:
+        return None
+
+
+def _pump(make_iter, put, stop: threading.Event):
+    """
+    Feed make_iter()'s items to put((item, None)), then put((_DONE, error)).
+    Returns early, without putting anything more, once stop is set.
+    """
+    it = None
+    try:
+        it = iter(make_iter())
+        for item in it:
+            if stop.is_set():
+                return
+            put((item, None))
+        put((_DONE, None))
+    except BaseException as e:
+        if not stop.is_set():
+            put((_DONE, e))
+    finally:
+        if hasattr(it, "close"):
+            it.close()  # run the iterator's own cleanup now, not at garbage collection
+
+
+class PriorityPool:
+    """
+    Thread pool whose queue is ordered by arrival time plus a handicap for long
+    audio, so short jobs overtake long ones without starving them. limits caps
+    how many workers one stage may hold; a task of a stage at its cap waits
+    while later tasks of other stages run.
+    """
+
+    def __init__(self, name: str, workers: int, limits: Optional[dict] = None):
+        self.name = name
+        self.workers = max(1, workers)
+        self.limits = dict(limits or {})
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._idle = 0
+        self._running = {}
+        self.submitted = 0
+        self.completed = 0
+        self.max_wait_sec = 0.0
+
+    def submit(self, fn, stage: str = "other", audio_sec: Optional[float] = None) -> Future:
+        """Queue fn() for a worker; audio_sec orders it against the other queued work."""
+        now = time.monotonic()
+        if audio_sec is None:
+            audio_sec = SCHED_UNKNOWN_AUDIO_SEC
+        key = now + SCHED_SEC_PER_AUDIO_MIN * audio_sec / 60
+        fut = Future()
+        with self._cond:
+            heapq.heappush(self._heap, (key, next(self._seq), now, stage, fut, fn))
+            self.submitted += 1
+            # Idle threads that were notified but haven't woken yet still count as idle, so
+            # compare against everything runnable: a burst gets one thread per task
+            if self._runnable() > self._idle and len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work, name=f"{self.name}_{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            if self._idle:
+                self._cond.notify_all()
+        return fut
+
+    def _runnable(self) -> int:
+        # Queued tasks a worker could start now; called with the lock held
+        queued = {}
+        for item in self._heap:
+            queued[item[3]] = queued.get(item[3], 0) + 1
+        return sum(max(0, min(n, self.limits[stage] - self._running.get(stage, 0))) if stage in self.limits else n
+                   for stage, n in queued.items())
+
+    def _next_task(self):
+        # Lowest key whose stage is under its limit; called with the lock held
+        skipped, task = [], None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            stage = item[3]
+            if stage in self.limits and self._running.get(stage, 0) >= self.limits[stage]:
+                skipped.append(item)
+                continue
+            task = item
+            break
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return task
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                    task = self._next_task()
+                _, _, queued_at, stage, fut, fn = task
+                self._running[stage] = self._running.get(stage, 0) + 1
+                wait = time.monotonic() - queued_at
+                self.max_wait_sec = max(self.max_wait_sec, wait)
+            observe(f"{stage}_queue", wait)
+            try:
+                if fut.set_running_or_notify_cancel():
+                    try:
+                        fut.set_result(fn())
+                    except BaseException as e:
+                        fut.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[stage] -= 1
+                    self.completed += 1
+                    # A slot of a capped stage freed up; waiting workers may now take its tasks
+                    self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.workers, "threads": len(self._threads), "queued": len(self._heap),
+                "running": {k: v for k, v in self._running.items() if v}, "submitted": self.submitted,
+                "completed": self.completed, "max_wait_sec": round(self.max_wait_sec, 3),
+            }
+
+
+class _StageExecutor(Executor):
+    """Executor view of one stage, usable with loop.run_in_executor."""
+
+    def __init__(self, pool: PriorityPool, stage: str, audio_sec: Optional[float]):
+        self._pool = pool
+        self._stage = stage
+        self._audio_sec = audio_sec
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        return self._pool.submit(functools.partial(fn, *args, **kwargs), self._stage, self._audio_sec)
+
+
+class StageScheduler:
+    """
+    Runs pipeline stages on separate pools: CPU-bound work (whisper, transcoding,
+    hashing) on SCHED_CPU_WORKERS threads, blocking I/O (downloads, DNS, waits on
+    the extractor or Azure OpenAI) on SCHED_IO_WORKERS threads. A few long
+    transcriptions can then no longer hold the threads short requests need.
+    """
+
+    def __init__(self, cpu_workers: int = SCHED_CPU_WORKERS, io_workers: int = SCHED_IO_WORKERS,
+                 transcribe_slots: int = SCHED_TRANSCRIBE_SLOTS):
+        self.pools = {
+            "cpu": PriorityPool("cpu", cpu_workers, {"transcribe": transcribe_slots}),
+            "io": PriorityPool("io", io_workers),
+        }
+
+    def executor(self, stage: str, audio_sec: Optional[float] = None) -> Executor:
+        """Executor for one stage call; audio_sec orders it against other queued work."""
+        return _StageExecutor(self.pools[STAGE_LANES.get(stage, "io")], stage, audio_sec)
+
+    def iterate(self, stage: str, make_iter, audio_sec: Optional[float] = None):
+        """
+        Run a blocking iterator on the stage's pool and yield its items here.
+        Closing the generator stops the worker after its current item, so an
+        abandoned transcription gives its slot back.
+        """
+        items = queue.Queue()
+        stop = threading.Event()
+        self.executor(stage, audio_sec).submit(_pump, make_iter, items.put, stop)
+        try:
+            while True:
+                item, err = items.get()
+                if item is _DONE:
+                    if err is not None:
+                        raise err
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    async def aiterate(self, stage: str, make_iter, audio_sec: Optional[float] = None):
+        """Async twin of iterate: the items are yielded on the running event loop."""
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        stop = threading.Event()
+        put = lambda msg: loop.call_soon_threadsafe(items.put_nowait, msg)
+        self.executor(stage, audio_sec).submit(_pump, make_iter, put, stop)
+        try:
+            while True:
+                item, err = await items.get()
+                if item is _DONE:
+                    if err is not None:
+                        raise err
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> StageScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = StageScheduler()
+        return _scheduler
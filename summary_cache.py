@@ -0,0 +1,149 @@
+import os, json, time, hashlib, sqlite3, tempfile, threading
+from collections import OrderedDict
+from typing import Optional
+
+# Summary cache settings (override via env)
+SUMMARY_CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR", os.path.join(tempfile.gettempdir(), "audiosummarizer"))
+SUMMARY_CACHE_MEM_ITEMS = int(os.getenv("SUMMARY_CACHE_MEM_ITEMS", "256"))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SUMMARY_CACHE_TTL_SEC = int(os.getenv("SUMMARY_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def hash_text_input(text_input) -> str:
+    # Transcripts arrive as dicts/lists or plain strings; hash a canonical form
+    if not isinstance(text_input, str):
+        text_input = json.dumps(text_input, sort_keys=True)
+    return hashlib.sha256(text_input.encode("utf-8")).hexdigest()
+
+def make_key(content_hash: str, sys_prompt: Optional[str], user_prompt: Optional[str], deployment: Optional[str]) -> str:
+    parts = [content_hash, (sys_prompt or "").strip(), (user_prompt or "").strip(), deployment or ""]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """
+    Two-tier cache of LLM summaries: an in-memory LRU in front of a SQLite file.
+
+    The disk tier is bounded by total bytes and entry age; the oldest-used rows are
+    evicted first. `bytes_saved` counts the request payload (base64 audio or
+    transcript text) that did not have to be sent to Azure OpenAI.
+    """
+
+    def __init__(self, cache_dir: str = SUMMARY_CACHE_DIR, mem_items: int = SUMMARY_CACHE_MEM_ITEMS,
+                 max_bytes: int = SUMMARY_CACHE_MAX_BYTES, ttl_sec: int = SUMMARY_CACHE_TTL_SEC):
+        self.mem_items = max(0, mem_items)
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self.mem_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._db = None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(cache_dir, "summaries.sqlite3"), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " key TEXT PRIMARY KEY, summary TEXT NOT NULL, payload_bytes INTEGER NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.commit()
+        except Exception as e:
+            # Fall back to memory-only caching if the disk tier is unavailable
+            print(f"[summary-cache] disk tier disabled: {e}")
+            self._db = None
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and now - entry[2] <= self.ttl_sec:
+                self._mem.move_to_end(key)
+                self.mem_hits += 1
+                self.bytes_saved += entry[1]
+                return entry[0]
+            if entry is not None:
+                del self._mem[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT summary, payload_bytes, created FROM summaries WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[2] <= self.ttl_sec:
+                    self._db.execute("UPDATE summaries SET accessed = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, row[0], row[1], row[2])
+                    self.disk_hits += 1
+                    self.bytes_saved += row[1]
+                    return row[0]
+                if row:
+                    self._db.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                    self._db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, key: str, summary: str, payload_bytes: int = 0):
+        now = time.time()
+        with self._lock:
+            self._remember(key, summary, payload_bytes, now)
+            if self._db is None:
+                return
+            size = len(summary.encode("utf-8"))
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, payload_bytes, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, summary, payload_bytes, size, now, now),
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def _remember(self, key, summary, payload_bytes, created):
+        if not self.mem_items:
+            return
+        self._mem[key] = (summary, payload_bytes, created)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_items:
+            self._mem.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        self._db.execute("DELETE FROM summaries WHERE created < ?", (now - self.ttl_sec,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM summaries ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM summaries WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.mem_hits + self.disk_hits + self.misses
+            return {
+                "mem_hits": self.mem_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.mem_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "mem_entries": len(self._mem),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> SummaryCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache()
+        return _cache
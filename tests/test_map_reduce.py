@@ -0,0 +1,106 @@
+import math, threading
+import pytest
+import Youtubetranscription_summarizer as yts
+
+
+class FakePhi:
+    """summarize() stand-in that records prompts and answers with reply_chars characters."""
+
+    def __init__(self, reply_chars: int = 40):
+        self.reply_chars = reply_chars
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def summarize(self, sysprompt, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            return f"summary {len(self.prompts)} ".ljust(self.reply_chars, "x")
+
+
+def test_reduce_empty_makes_no_calls():
+    phi = FakePhi()
+    assert yts.reduce_summaries([], "sys", phi) == ""
+    assert phi.prompts == []
+
+
+def test_reduce_single_partial_is_returned_as_is():
+    phi = FakePhi()
+    assert yts.reduce_summaries(["only one"], "sys", phi) == "only one"
+    assert phi.prompts == []
+
+
+def test_reduce_small_partials_take_log_rounds():
+    phi = FakePhi()
+    out = yts.reduce_summaries([f"part {i}" for i in range(16)], "sys", phi, fan_in=4)
+    # 16 -> 4 -> 1: four merges in round one, then the final one
+    assert len(phi.prompts) == 5
+    assert out.startswith("summary 5")
+    assert phi.prompts[-1].startswith("Merge the 4 chunk summaries into one concise summary")
+
+
+def test_reduce_odd_group_count_carries_leftover_over():
+    phi = FakePhi()
+    yts.reduce_summaries([f"part {i}" for i in range(5)], "sys", phi, fan_in=2)
+    # 5 -> [2, 2, 1] -> 3 -> [2, 1] -> 2 -> [2]; a lone leftover never costs a call
+    assert len(phi.prompts) == 4
+    assert all("Merge the 1 " not in p for p in phi.prompts)
+
+
+@pytest.mark.parametrize("n", [2, 3, 9, 40])
+def test_reduce_over_budget_partials_terminate(n):
+    # Every partial and every merge result is over the token budget on its own
+    phi = FakePhi(reply_chars=12000)
+    out = yts.reduce_summaries(["y" * 12000] * n, "sys", phi, max_tokens=3000, fan_in=4)
+    assert out.startswith("summary")
+    # Pairs are merged even over budget, so each round at least halves the list
+    assert len(phi.prompts) <= n - 1
+    assert len(phi.prompts) >= math.ceil((n - 1) / 3)
+
+
+def test_reduce_last_round_merges_everything():
+    phi = FakePhi(reply_chars=12000)
+    yts.reduce_summaries(["y" * 12000] * 40, "sys", phi, max_tokens=3000, fan_in=2, max_rounds=2)
+    # Round one pairs 40 -> 20, round two is the last and merges all 20 at once
+    assert len(phi.prompts) == 21
+    assert phi.prompts[-1].startswith("Merge the 20 chunk summaries")
+
+
+def _segments(n, text="word " * 20):
+    return [{"start": i * 5.0, "end": i * 5.0 + 5.0, "text": text} for i in range(n)]
+
+
+def test_chunk_segments_respects_budget_and_order():
+    segs = _segments(50)
+    seg_tokens = yts.estimate_tokens(yts.format_segments(segs[:1]))
+    chunks = yts.chunk_segments_by_tokens(segs, max_tokens=seg_tokens * 4)
+    assert [s for c in chunks for s in c] == segs
+    assert all(len(c) == 4 for c in chunks[:-1]) and len(chunks[-1]) == 2
+    assert all(sum(yts.estimate_tokens(yts.format_segments([s])) for s in c) <= seg_tokens * 4 for c in chunks)
+
+
+def test_chunk_segments_oversized_segment_gets_own_chunk():
+    segs = _segments(2) + [{"start": 10.0, "end": 15.0, "text": "long " * 4000}] + _segments(2)
+    chunks = yts.chunk_segments_by_tokens(segs, max_tokens=500)
+    assert [len(c) for c in chunks] == [2, 1, 2]
+
+
+def test_chunk_segments_empty():
+    assert yts.chunk_segments_by_tokens([], max_tokens=100) == []
+
+
+def test_reduce_final_merge_carries_user_prompt():
+    phi = FakePhi()
+    yts.reduce_summaries([f"part {i}" for i in range(16)], "sys", phi, fan_in=4,
+                         final_instructions="List the action items.")
+    # Only the answer-producing merge is shaped by the user's prompt
+    assert phi.prompts[-1].startswith("List the action items.")
+    assert all("List the action items." not in p for p in phi.prompts[:-1])
+
+
+def test_summarize_with_phi_threads_user_prompt_to_final_merge():
+    phi = FakePhi()
+    segs = _segments(40)
+    seg_tokens = yts.estimate_tokens(yts.format_segments(segs[:1]))
+    yts.summarize_with_phi(segs, "sys", "List the action items.", phi, max_tokens=seg_tokens * 4, fan_in=4)
+    assert len(phi.prompts) == 10 + 3 + 1
+    assert phi.prompts[-1].startswith("List the action items.")
@@ -0,0 +1,57 @@
+import pytest
+from parallel_transcribe import plan_chunks
+
+SR = 16000
+
+
+def _speech(regions_sec):
+    return [{"start": int(a * SR), "end": int(b * SR)} for a, b in regions_sec]
+
+
+def _assert_covers(chunks, n_samples):
+    # keep ranges tile [0, n_samples) exactly, each inside its decode range
+    assert chunks[0][2] == 0 and chunks[-1][3] == n_samples
+    for (_, _, _, keep_to), (_, _, keep_from, _) in zip(chunks, chunks[1:]):
+        assert keep_to == keep_from
+    for start, end, keep_from, keep_to in chunks:
+        assert 0 <= start <= keep_from < keep_to <= end <= n_samples
+
+
+def test_short_audio_is_one_chunk():
+    n = 200 * SR
+    assert plan_chunks(n, [], target_sec=300) == [(0, n, 0, n)]
+
+
+def test_cuts_land_in_silences_without_overlap():
+    # Speech in 10 s blocks separated by 1 s of silence
+    regions = [(t, t + 10) for t in range(0, 1200, 11)]
+    n = 1200 * SR
+    chunks = plan_chunks(n, _speech(regions), target_sec=300, overlap_sec=2)
+    _assert_covers(chunks, n)
+    assert len(chunks) == 4
+    gaps = {(regions[i][1] * SR + regions[i + 1][0] * SR) // 2 for i in range(len(regions) - 1)}
+    for start, end, keep_from, keep_to in chunks[1:]:
+        assert keep_from in gaps
+        assert start == keep_from  # cut at a silence needs no extra context
+    for start, end, keep_from, keep_to in chunks:
+        assert 150 * SR <= keep_to - keep_from <= 450 * SR
+
+
+def test_forced_cuts_get_overlap_on_both_sides():
+    n = 1000 * SR
+    chunks = plan_chunks(n, _speech([(0, 1000)]), target_sec=300, overlap_sec=2)
+    _assert_covers(chunks, n)
+    assert [c[2] // SR for c in chunks] == [0, 300, 600]
+    first, second, last = chunks
+    assert first[:2] == (0, 302 * SR)
+    assert second[:2] == (298 * SR, 602 * SR)
+    assert last[:2] == (598 * SR, n)
+
+
+@pytest.mark.parametrize("seconds", [451, 601, 3601])
+def test_tail_is_never_a_sliver(seconds):
+    n = seconds * SR
+    chunks = plan_chunks(n, [], target_sec=300)
+    _assert_covers(chunks, n)
+    # the loop stops once what is left is under 1.5 targets, so the tail is 150..450 s
+    assert 150 * SR <= chunks[-1][3] - chunks[-1][2] <= 450 * SR
@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import wait
+from scheduler import PriorityPool
+
+
+def _burst(pool, n, sec, stage="other"):
+    t0 = time.monotonic()
+    futures = [pool.submit(lambda: time.sleep(sec), stage) for _ in range(n)]
+    wait(futures, timeout=10)
+    return time.monotonic() - t0
+
+
+def _settle(pool):
+    # Let a first task finish so its thread is parked as idle
+    pool.submit(lambda: None).result(timeout=5)
+    deadline = time.monotonic() + 5
+    while pool._idle == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool._idle == 1
+
+
+def test_burst_runs_in_parallel_with_an_idle_thread():
+    pool = PriorityPool("t", 4)
+    _settle(pool)
+    assert _burst(pool, 4, 0.5) < 0.9
+    assert pool.stats()["threads"] == 4
+
+
+def test_threads_never_exceed_workers():
+    pool = PriorityPool("t", 2)
+    assert _burst(pool, 6, 0.2) >= 0.6
+    assert pool.stats()["threads"] == 2
+
+
+def test_stage_limit_serializes_capped_stage_only():
+    pool = PriorityPool("t", 4, {"transcribe": 1})
+    _settle(pool)
+    t0 = time.monotonic()
+    capped = [pool.submit(lambda: time.sleep(0.3), "transcribe") for _ in range(2)]
+    other = [pool.submit(lambda: time.sleep(0.3), "encode") for _ in range(2)]
+    wait(other, timeout=10)
+    assert time.monotonic() - t0 < 0.5  # short work isn't stuck behind the capped stage
+    wait(capped, timeout=10)
+    assert time.monotonic() - t0 >= 0.6
+    # No thread is started for tasks that can only wait for the capped slot
+    assert pool.stats()["threads"] <= 3
@@ -0,0 +1,125 @@
+import os, sys, json, gzip, hashlib, tempfile, threading
+from typing import Optional
+
+# Transcript cache settings (override via env)
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "audiosummarizer", "transcripts"))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class TranscriptCache:
+    """
+    On-disk cache of faster-whisper transcripts keyed by (video ID, model, VAD settings).
+
+    Each entry is a gzip'd JSON list of [start, end, text] rows named
+    "<video_id>.<settings-hash>.json.gz", so one video's entries can be dropped
+    together. File mtime doubles as the LRU clock; the directory is trimmed to
+    `max_bytes` on every write.
+    """
+
+    def __init__(self, cache_dir: str = TRANSCRIPT_CACHE_DIR, max_bytes: int = TRANSCRIPT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, video_id: str, model_name: str, vad_filter: bool, vad_parameters: Optional[dict]) -> str:
+        settings = json.dumps([model_name, bool(vad_filter), vad_parameters or {}], sort_keys=True)
+        digest = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{video_id}.{digest}.json.gz")
+
+    def get(self, video_id: str, model_name: str, vad_filter: bool = True, vad_parameters: Optional[dict] = None):
+        path = self._path(video_id, model_name, vad_filter, vad_parameters)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                rows = json.load(f)
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            print(f"[transcript-cache] dropping unreadable entry {path}: {e}")
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return {"segments": [{"start": r[0], "end": r[1], "text": r[2]} for r in rows]}
+
+    def put(self, video_id: str, model_name: str, transcript: dict, vad_filter: bool = True,
+            vad_parameters: Optional[dict] = None):
+        path = self._path(video_id, model_name, vad_filter, vad_parameters)
+        rows = [[round(s["start"], 2), round(s["end"], 2), s["text"]] for s in transcript.get("segments", [])]
+        fd, tmp = tempfile.mkstemp(prefix=".transcript.", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(rows, separators=(",", ":")).encode("utf-8"))
+            os.replace(tmp, path)
+        except Exception:
+            self._remove(tmp)
+            raise
+        self._evict()
+
+    def invalidate(self, video_id: Optional[str] = None) -> int:
+        """Remove all entries for video_id (any model/VAD settings), or everything if None."""
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json.gz"):
+                continue
+            if video_id is None or name.startswith(f"{video_id}."):
+                self._remove(os.path.join(self.cache_dir, name))
+                removed += 1
+        return removed
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json.gz"):
+                    try:
+                        st = os.stat(os.path.join(self.cache_dir, name))
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, name))
+            total = sum(e[1] for e in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(os.path.join(self.cache_dir, name))
+                total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> TranscriptCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranscriptCache()
+        return _cache
+
+
+if __name__ == "__main__":
+    # python transcript_cache.py --invalidate <video_id>   |   python transcript_cache.py --clear
+    if len(sys.argv) == 3 and sys.argv[1] == "--invalidate":
+        print(f"Removed {get_cache().invalidate(sys.argv[2])} entries for {sys.argv[2]}")
+    elif len(sys.argv) == 2 and sys.argv[1] == "--clear":
+        print(f"Removed {get_cache().invalidate()} entries")
+    else:
+        print("usage: transcript_cache.py --invalidate <video_id> | --clear")
+        sys.exit(1)